@@ -0,0 +1,203 @@
+# This is a benchmark runner for the library. It renders each signal class, a note from each
+# instrument, and the example songs, and records how fast and how memory-hungry that was.
+# It doesn't need an audio device.
+#
+# Usage: python benchmarks/run.py [-o results.json] [--compare old.json] [name substrings...]
+
+# pylint: disable=unnecessary-lambda
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, os.path.join(HERE, '..', 'examples'))
+
+import sound
+from sound import SAMPLE_RATE
+from sound import signal, tone, filter, envelope, instrument  # pylint: disable=redefined-builtin
+
+sound.set_offline()
+
+def _sine():
+    return tone.SineWave(440)
+
+def _lfo():
+    return tone.SineWave(3) * 0.5 + 0.5
+
+# Each case is a function returning a fresh signal and the number of seconds of it to render.
+# A fresh signal is built for every run so that impure signals start from scratch.
+CLASS_CASES = {
+    'signal.LoopSignal': lambda: (signal.LoopSignal(_sine(), 0.01), 1),
+    'signal.DelaySignal': lambda: (signal.DelaySignal(_sine(), SAMPLE_RATE // 2), 1),
+    'signal.SequenceSignal': lambda: (signal.SequenceSignal(*((tone.SineWave(220 + i)[0:0.05], i * 0.05) for i in range(20))), 1),
+    'signal.InvertSignal': lambda: (signal.InvertSignal(_sine()), 1),
+    'signal.ConstantSignal': lambda: (signal.ConstantSignal(0.5), 1),
+    'signal.MixSignal': lambda: (signal.MixSignal(*(tone.SineWave(220 * i) for i in range(1, 9))), 1),
+    'signal.EnvelopeSignal': lambda: (signal.EnvelopeSignal(_sine(), _lfo()), 1),
+    'signal.Purifier': lambda: (signal.Purifier(tone.Noise()), 1),
+    'signal.SliceSignal': lambda: (signal.SliceSignal(_sine(), 0.5, 1.5), 1),
+    'signal.ReverseSignal': lambda: (signal.ReverseSignal(_sine()[0:1]), 1),
+    'tone.SineWave': lambda: (tone.SineWave(440), 1),
+    'tone.SineWave(fast)': lambda: (tone.SineWave(440, fast=True), 1),
+    'tone.SquareWave': lambda: (tone.SquareWave(440), 1),
+    'tone.SawtoothWave': lambda: (tone.SawtoothWave(440), 1),
+    'tone.TriangleWave': lambda: (tone.TriangleWave(440), 1),
+    'tone.SquareWave(bandlimited)': lambda: (tone.SquareWave(440, bandlimited=True), 1),
+    'tone.SawtoothWave(bandlimited)': lambda: (tone.SawtoothWave(440, bandlimited=True), 1),
+    'tone.TriangleWave(bandlimited)': lambda: (tone.TriangleWave(440, bandlimited=True), 1),
+    'tone.Noise': lambda: (tone.Noise(), 1),
+    'tone.BrownNoise': lambda: (tone.BrownNoise(), 1),
+    'tone.Digitar': lambda: (tone.Digitar(440), 1),
+    'tone.harmonics': lambda: (sum(tone.harmonics(220)), 1),
+    'tone.Additive': lambda: (tone.Additive(220, range(1, 17)), 1),
+    'tone.wavetable': lambda: (tone.wavetable([0, 1, 0, -1])(440), 1),
+    'tone.Wavetable': lambda: (tone.Wavetable([0, 1, 0, -1], 440, 'cubic'), 1),
+    'filter.LowPassFilter': lambda: (filter.LowPassFilter(tone.Noise()), 1),
+    'filter.BetterLowPassFilter': lambda: (filter.BetterLowPassFilter(tone.Noise(), 1, 2, 3, 2, 1), 1),
+    'filter.HighPassFilter': lambda: (filter.HighPassFilter(tone.Noise()), 1),
+    'filter.FakeFMFilter': lambda: (filter.FakeFMFilter(tone.SineWave, tone.SineWave(100)), 1),
+    'filter.FMFilter': lambda: (filter.FMFilter(tone.SineWave(440), tone.SineWave(220)), 1),
+    'filter.ring_filter': lambda: (filter.ring_filter(tone.harmonics(440, (2, 3, 4))), 1),
+    'filter.bessel_wave': lambda: (filter.bessel_wave(440, 0.5, 0.5), 1),
+    'filter.PitchShift': lambda: (filter.PitchShift(_sine(), _lfo()), 1),
+    'envelope.Envelope': lambda: (envelope.Envelope(1) * _sine(), 1),
+    'envelope.ADSR': lambda: (envelope.ADSR(0.1, 0.1, 0.5, 0.3) * _sine(), 1),
+    'envelope.Decay': lambda: (envelope.Decay(0.1, 0.5, 0.4) * _sine(), 1),
+    'envelope.Line': lambda: (envelope.Line(0, 1, 1) * _sine(), 1),
+    'envelope.envelope': lambda: (envelope.envelope(decay=0.1, attack=0.01) * _sine(), 1),
+}
+
+def _instrument_case(cls):
+    def case():
+        note = cls().note(220, 2)
+        return note, min(note.duration / SAMPLE_RATE, 5)
+    return case
+
+# SampledDrum needs sample files, so it isn't covered
+INSTRUMENT_CASES = {
+    'instrument.' + name: _instrument_case(getattr(instrument, name))
+    for name in ('SineSustain', 'SineHit', 'KickDrum', 'Shaker', 'BassDrum', 'SquareViolin', 'HardDisk',
+                 'ElectricHorn', 'Bell', 'Bell2', 'ElectricBass', 'Guitar')
+}
+
+def _glitch_song():
+    import glitch_song
+    tune = glitch_song.main_tune()
+    return tune, tune.duration / SAMPLE_RATE
+
+def _melody_case(name):
+    def case():
+        import parsejson
+        music = parsejson.MusicData(os.path.join(HERE, '..', 'examples', 'format.json'))
+        melody = music.melody(name)
+        return melody, melody.duration / SAMPLE_RATE
+    return case
+
+def song_cases():
+    with open(os.path.join(HERE, '..', 'examples', 'format.json')) as fp:
+        names = json.load(fp)['melodies']
+    cases = {'examples.glitch_song': _glitch_song}
+    for name in names:
+        cases['examples.format.' + name] = _melody_case(name)
+    return cases
+
+def measure(case, repeat):
+    """
+    Render the signal made by case, repeat times, plus once more under tracemalloc.
+    Return a dict of the results.
+    """
+    best = float('inf')
+    frames = 0
+    for _ in range(repeat):
+        sig, length = case()
+        t0 = time.perf_counter()
+        out = sig.render(length, clip_warn=False)
+        best = min(best, time.perf_counter() - t0)
+        frames = len(out)
+
+    sig, length = case()
+    tracemalloc.start()
+    sig.render(length, clip_warn=False)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'frames': frames,
+        'seconds': best,
+        'frames_per_second': frames / best if best else float('inf'),
+        'realtime_factor': frames / SAMPLE_RATE / best if best else float('inf'),
+        'peak_memory_bytes': peak,
+    }
+
+def compare(old, new, threshold):
+    """
+    Print the change in speed between two result sets. Return the names of the cases which got
+    slower by more than the given fraction.
+    """
+    slower = []
+    for name, result in sorted(new['results'].items()):
+        if name not in old['results']:
+            continue
+        ratio = result['frames_per_second'] / old['results'][name]['frames_per_second']
+        mark = ''
+        if ratio < 1 - threshold:
+            mark = '  <-- slower'
+            slower.append(name)
+        print('%-36s %6.2fx%s' % (name, ratio, mark), file=sys.stderr)
+    return slower
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark rendering speed and memory use.')
+    parser.add_argument('filters', nargs='*', help='Only run cases whose names contain one of these')
+    parser.add_argument('-o', '--output', help='Write the JSON results here instead of to stdout')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='Take the best of this many timed runs')
+    parser.add_argument('--compare', help='A previous JSON results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1, help='The slowdown which counts as a regression when comparing')
+    args = parser.parse_args(argv)
+
+    cases = {}
+    cases.update(CLASS_CASES)
+    cases.update(INSTRUMENT_CASES)
+    cases.update(song_cases())
+
+    results = {}
+    for name, case in cases.items():
+        if args.filters and not any(f in name for f in args.filters):
+            continue
+        print('%s...' % name, file=sys.stderr)
+        random.seed(0)
+        results[name] = measure(case, args.repeat)
+
+    data = {
+        'version': sound.__version__,
+        'python': platform.python_implementation() + ' ' + platform.python_version(),
+        'numpy': numpy.__version__,
+        'machine': platform.machine(),
+        'sample_rate': SAMPLE_RATE,
+        'repeat': args.repeat,
+        'results': results,
+    }
+    text = json.dumps(data, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as fp:
+            fp.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as fp:
+            old = json.load(fp)
+        if compare(old, data, args.threshold):
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
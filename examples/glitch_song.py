@@ -7,7 +7,7 @@ import sound
 from sound.notes import *
 from sound.instrument import Instrument, Guitar
 from sound.tone import Digitar, SquareWave, SAMPLE_RATE
-from sound.signal import SliceSignal, Purifier, ReverseSignal, ConstantSignal
+from sound.signal import SliceSignal, Purifier, ReverseSignal, ConstantSignal, Timeline
 
 def strum_stuff(guitar, chord, length, bpm, basebeat=0):
     base = basebeat * SAMPLE_RATE * 60 / bpm
@@ -21,10 +21,10 @@ def strum_stuff(guitar, chord, length, bpm, basebeat=0):
     guitar.queue(base + L1 + L2 + L1 + L2 + L2, (guitar.strum_up, (chord,)))
 
 def n_of_them(them, n):
-    o = them
-    for _ in range(n - 1):
-        o &= them
-    return o
+    o = Timeline()
+    for _ in range(n):
+        o.append(them)
+    return o.freeze()
 
 def sampslice(src, start, length):
     return SliceSignal(src, float(start)/SAMPLE_RATE, float(length)/SAMPLE_RATE, True)
@@ -8,7 +8,6 @@ import sound
 import sys
 import json
 import copy
-from functools import reduce
 
 try:
     num = (int, long, float)
@@ -130,7 +129,7 @@ class MusicData(object):
         return self._parse_melody(melody, instrument)
 
     def _parse_melody(self, sequence, instrument):
-        out = None
+        out = sound.note.NoteTimeline()
 
         for note in sequence:
             inst = copy.copy(instrument)
@@ -157,21 +156,23 @@ class MusicData(object):
             else:
                 raise TypeError('note %s is of no known form!' % note)
 
-            if "loop" in note:
-                if p.pure:
-                    p = reduce(lambda x, y: x & y, [p]*note['loop'])
-                else:
-                    ct = note['loop'] - 1
-                    cpy = copy.copy(note)
-                    del cpy['loop']
-                    p &= self._parse_melody([cpy]*ct, inst)
-
-            if out is None:
-                out = p
+            if p is None:
+                continue
+
+            if "loop" in note and p.pure:
+                for _ in range(note['loop']):
+                    out.append(p)
+            elif "loop" in note:
+                ct = note['loop'] - 1
+                cpy = copy.copy(note)
+                del cpy['loop']
+                out.append(p)
+                if ct > 0:
+                    out.append(self._parse_melody([cpy]*ct, inst))
             else:
-                out &= p
+                out.append(p)
 
-        return out
+        return out.freeze()
 
 
 def main(filename, melodyname):
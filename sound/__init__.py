@@ -1,12 +1,48 @@
 # pylint: disable=redefined-builtin
-import sounddevice as sd
+import os
+
 SAMPLE_RATE = 44100
-sd.default.samplerate = SAMPLE_RATE  # type: ignore
-sd.default.channels = 1  # type: ignore
 
-__all__ = ('tone', 'sample', 'envelope', 'filter', 'instrument', 'notes', 'note', 'asyncplayer')
+__all__ = ('tone', 'sample', 'envelope', 'filter', 'instrument', 'notes', 'note', 'asyncplayer', 'wavfile', 'sink', 'set_offline')
 __version__ = "1.1.1-dev.1"
 released_version = "1.1.0"
 
-from . import tone, sample, envelope, filter, instrument, notes, note, asyncplayer
+_sd = None
+_offline = os.environ.get('SOUND_MACHINE_OFFLINE', '') not in ('', '0')
+
+def set_offline(offline=True):
+    """
+    Turn offline mode on or off. In offline mode, anything that needs an audio device raises
+    RuntimeError instead of loading `sounddevice`, so rendering and writing files works on
+    machines without any audio libraries. Setting the environment variable
+    SOUND_MACHINE_OFFLINE=1 turns it on from the start.
+
+    `sounddevice` is only ever loaded the first time something is played or recorded, so
+    importing this library is fast either way.
+
+    :param offline:     Whether to be offline. Optional, defaults to True.
+    """
+    global _offline
+    _offline = offline
+
+def _sounddevice():
+    """
+    Return the `sounddevice` module, importing and configuring it the first time.
+    """
+    global _sd
+    if _offline:
+        raise RuntimeError("Can't use an audio device in offline mode")
+    if _sd is None:
+        import sounddevice  # pylint: disable=import-outside-toplevel
+        sounddevice.default.samplerate = SAMPLE_RATE  # type: ignore
+        sounddevice.default.channels = 1  # type: ignore
+        _sd = sounddevice
+    return _sd
+
+def __getattr__(name):
+    # sound.sd used to be imported eagerly, so keep it working as a lazy attribute
+    if name == 'sd':
+        return _sounddevice()
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
+from . import tone, sample, envelope, filter, instrument, notes, note, asyncplayer, wavfile, sink
@@ -1,4 +1,8 @@
 import bisect
+import collections
+import math
+
+import numpy
 
 from .signal import Signal
 from .notes import notename
@@ -9,6 +13,12 @@ class AsyncPlayer(Signal):
 
     The idea is that you call `.play_async()` on it, then you can call `.play()` and `.mute()`
     on different sound objects to play or stop them in real time.
+
+    Calls to `.play()`, `.mute()` and `.queue()` don't touch the playing state directly, since
+    that belongs to whichever thread is rendering. Instead they are appended to a command deque
+    which is drained at the start of each rendered block, so they take effect at most one block
+    after they're made, plus however far ahead of the device rendering is running
+    (see `Signal.play_async`).
     """
     def __init__(self):
         self.frame = 0
@@ -17,15 +27,49 @@ class AsyncPlayer(Signal):
         self.playing = []
         self.infinite = []
         self.callbacks = []
-        self.to_play = []
+        self.commands = collections.deque()
 
     def amplitude(self, frame):
-        for n in self.to_play:
-            self._play(n)
-        self.to_play = []
+        self._step(frame)
 
         out = 0.
+        for _, start, note in self.playing:
+            out += note.amplitude(frame - start)
+        for start, note in self.infinite:
+            out += note.amplitude(frame - start)
+
+        return out
+
+    def amplitude_block(self, start, n):
+        out = numpy.zeros((n,))
+        frame = start
+        while frame < start + n:
+            self._step(frame)
+
+            # render up to the next frame where something starts or stops
+            end = start + n
+            if len(self.callbacks) != 0:
+                end = min(end, int(math.ceil(-self.callbacks[-1][0])))
+            if len(self.playing) != 0:
+                end = min(end, -self.playing[-1][0])
+
+            for _, begin, note in self.playing:
+                out[frame-start:end-start] += note.amplitude_block(frame - begin, end - frame)
+            for begin, note in self.infinite:
+                out[frame-start:end-start] += note.amplitude_block(frame - begin, end - frame)
+            frame = end
+
+        # leave self.frame at the last frame rendered, as rendering frame by frame would
+        self.frame = start + n - 1
+        return out
+
+    def _step(self, frame):
+        """
+        Bring the playing state up to the given frame: apply pending commands, fire due
+        callbacks, and drop finished sounds.
+        """
         self.frame = frame
+        self._drain()
         while len(self.callbacks) != 0 and frame >= -self.callbacks[-1][0]:
             _, callback = self.callbacks.pop()
             if callable(callback):
@@ -37,16 +81,15 @@ class AsyncPlayer(Signal):
                     self.play(*callback)  # type: ignore
             else:
                 self.play(callback)
+            self._drain()
 
         while len(self.playing) != 0 and frame >= -self.playing[-1][0]:
             self.playing.pop()
 
-        for _, start, note in self.playing:
-            out += note.amplitude(frame - start)
-        for start, note in self.infinite:
-            out += note.amplitude(frame - start)
-
-        return out
+    def _drain(self):
+        while len(self.commands) != 0:
+            func, args = self.commands.popleft()
+            func(*args)
 
     def _play(self, note):
         if note.duration == float('inf'):
@@ -55,16 +98,7 @@ class AsyncPlayer(Signal):
             end = self.frame + int(note.duration)
             bisect.insort(self.playing, (-end, self.frame, note))
 
-    def play(self, note):  # type: ignore[reportIncompatibleMethodOverride]
-        """
-        :param note:    A Signal object to play, starting now.
-        """
-        self.to_play.append(note)
-
-    def mute(self, note):
-        """
-        :param note:    The sound object to mute. Works based on object identity.
-        """
+    def _mute(self, note):
         i = 0
         while i < len(self.playing):
             if self.playing[i][2] == note:
@@ -78,6 +112,29 @@ class AsyncPlayer(Signal):
             else:
                 i += 1
 
+    def _queue(self, when, func, relative):
+        if relative: when += self.frame
+        bisect.insort(self.callbacks, (-when, func))
+
+    def _unqueue(self, func):
+        self.callbacks = [event for event in self.callbacks if event[1] is not func]
+
+    def _play_then(self, note, func):
+        self._play(note)
+        self._queue(int(note.duration), func, True)
+
+    def play(self, note):  # type: ignore[reportIncompatibleMethodOverride]
+        """
+        :param note:    A Signal object to play, starting now.
+        """
+        self.commands.append((self._play, (note,)))
+
+    def mute(self, note):
+        """
+        :param note:    The sound object to mute. Works based on object identity.
+        """
+        self.commands.append((self._mute, (note,)))
+
     def queue(self, when, func, relative=True):
         """
         Queue an event some number of frames in the future.
@@ -85,14 +142,47 @@ class AsyncPlayer(Signal):
         :param when:        The number of frames in the future to perform the event
         :param func:        The thing to do in the future
         :param relative:    Optional. If set to false, `when` serves as an absolute timestamp since
-                            play started instead of a relative count.
+                            play started instead of a relative count. Relative counts start from
+                            the frame where the call takes effect, just like `.play()`.
 
         If func is a callable object, it will be called.
         If func is a tuple, `self.play()` will be called with the tuple contents as args
         Other wise, `self.play()` will be called with func as an argument.
         """
-        if relative: when += self.frame
-        bisect.insort(self.callbacks, (-when, func))
+        self.commands.append((self._queue, (when, func, relative)))
+
+    def unqueue(self, func):
+        """
+        Cancel every queued event for the given thing to do. Works based on object identity.
+
+        :param func:        The thing to do, as passed to `.queue()`
+        """
+        self.commands.append((self._unqueue, (func,)))
+
+    def play_then(self, note, func):
+        """
+        Play a finite sound starting now, and queue an event for the frame where it finishes.
+        Both take effect on the same frame.
+
+        :param note:        A Signal object to play
+        :param func:        The thing to do when it finishes, as for `.queue()`
+        """
+        self.commands.append((self._play_then, (note, func)))
+
+_shared_mixer = None
+_shared_stream = None
+
+def shared_mixer():
+    """
+    Return the AsyncPlayer which `Signal.aplay` mixes into, starting its output stream the first
+    time it's asked for. It keeps playing until the process exits. If the stream has stopped
+    for any reason, a new player and stream are started.
+    """
+    global _shared_mixer, _shared_stream
+    if _shared_mixer is None or _shared_stream is None or not _shared_stream.active:
+        _shared_mixer = AsyncPlayer()
+        _shared_stream = _shared_mixer.play_async()
+    return _shared_mixer
 
 class KeyedAsyncPlayer(AsyncPlayer):
     """
@@ -140,8 +230,8 @@ class InstrumentPlayer(KeyedAsyncPlayer):
         """
         All parameters are passed directly through to `instrument.note()`
         """
-        sig = self.instrument(note, *args, **kwargs)
-        super(InstrumentPlayer, self).play(note, sig)
+        sig = self.instrument.note(note, *args, **kwargs)
+        super(InstrumentPlayer, self).play(sig, note)
 
 class GuitarStrummer(KeyedAsyncPlayer):
     """
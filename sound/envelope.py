@@ -1,5 +1,6 @@
-from typing import Union
+from typing import Hashable, Union
 import math
+import numpy
 
 from . import SAMPLE_RATE
 from .signal import ConstantSignal, Signal
@@ -23,6 +24,12 @@ class Envelope(Signal):
             return 1.
         return 0.
 
+    def amplitude_frames(self, frames):
+        return ((frames >= 0) & (frames < self.duration)).astype(float)
+
+    def cache_key(self) -> Hashable:
+        return (Envelope, self.duration)
+
     def apply_adsr(self, attack, decay, release, attack_level=1, sustain_level=0.5):
         """
         Return the current envelope with an additional ADSR component.
@@ -85,6 +92,30 @@ class ADSR(Envelope):
             return float(frame) / self.release * -self.sustain_level + self.sustain_level
         return 0.
 
+    def amplitude_frames(self, frames):
+        frames = numpy.array(frames, dtype=float)
+        out = numpy.zeros(len(frames))
+        # each segment only gets the frames that none of the earlier segments claimed
+        todo = frames >= 0
+        mask = todo & (frames < self.attack)
+        out[mask] = frames[mask] / self.attack * self.attack_level
+        todo &= ~mask
+        frames -= self.attack
+        mask = todo & (frames < self.decay)
+        out[mask] = frames[mask] / self.decay * -(self.attack_level - self.sustain_level) + self.attack_level
+        todo &= ~mask
+        frames -= self.decay
+        mask = todo & (frames < self.sustain)
+        out[mask] = self.sustain_level
+        todo &= ~mask
+        frames -= self.sustain
+        mask = todo & (frames < self.release)
+        out[mask] = frames[mask] / self.release * -self.sustain_level + self.sustain_level
+        return out
+
+    def cache_key(self):
+        return (ADSR, self.attack, self.decay, self.sustain, self.release, self.attack_level, self.sustain_level)
+
 class Decay(Envelope):
     """
     An enevelope with an attack[1], an exponential decay[2], and a release[3].
@@ -121,6 +152,26 @@ class Decay(Envelope):
             return float(frame) / self.release * -self.release_level + self.release_level
         return 0
 
+    def amplitude_frames(self, frames):
+        frames = numpy.array(frames, dtype=float)
+        out = numpy.zeros(len(frames))
+        # each segment only gets the frames that none of the earlier segments claimed
+        todo = frames >= 0
+        mask = todo & (frames < self.attack)
+        out[mask] = frames[mask] / self.attack * self.attack_level
+        todo &= ~mask
+        frames -= self.attack
+        mask = todo & (frames < self.sustain)
+        out[mask] = self.decay_param ** (frames[mask] / SAMPLE_RATE) * self.attack_level
+        todo &= ~mask
+        frames -= self.sustain
+        mask = todo & (frames < self.release)
+        out[mask] = frames[mask] / self.release * -self.release_level + self.release_level
+        return out
+
+    def cache_key(self):
+        return (Decay, self.attack, self.sustain, self.release, self.decay_param, self.attack_level)
+
 def envelope(sustain=None,
              attack=0.01,
              decay=None,
@@ -181,3 +232,13 @@ class Line(Envelope):
             return self.end
         return (float(frame) / self.duration) * (self.end - self.start) + self.start
 
+    def amplitude_frames(self, frames):
+        out = numpy.full(len(frames), float(self.start))
+        out[(frames >= 0) & (frames >= self.duration)] = self.end
+        mask = (frames >= 0) & (frames < self.duration)
+        out[mask] = (frames[mask] / self.duration) * (self.end - self.start) + self.start
+        return out
+
+    def cache_key(self):
+        return (Line, self.start, self.end, self.duration)
+
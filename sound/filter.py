@@ -1,3 +1,5 @@
+import numpy
+
 from .signal import ConstantSignal, Signal
 from .tone import SineWave
 
@@ -140,6 +142,13 @@ class FMFilter(Signal):
     def amplitude(self, frame):
         return self.carrier.amplitude(frame + self.mod_quantity * self.modulator.amplitude(frame))
 
+    def amplitude_block(self, start, n):
+        frames = numpy.arange(start, start + n) + self.mod_quantity * self.modulator.amplitude_block(start, n)
+        return self.carrier.amplitude_frames(frames)
+
+    def amplitude_frames(self, frames):
+        return self.carrier.amplitude_frames(frames + self.mod_quantity * self.modulator.amplitude_frames(frames))
+
 def ring_filter(data):
     """
     Perform ring modulation on a given number of signals.
@@ -2,7 +2,7 @@
 from .import SAMPLE_RATE
 from .filter import HighPassFilter, FakeFMFilter, LowPassFilter, FMFilter, ring_filter, PitchShift
 from .envelope import Decay, envelope, Envelope, ADSR
-from .tone import SineWave as Sine, harmonics, Noise, Digitar
+from .tone import SineWave as Sine, Additive, harmonics, Noise, Digitar
 from .note import Note
 from .sample import RawData
 
@@ -142,7 +142,7 @@ class SquareViolin(Instrument):
         #               decaying_sustain=False)
         env = Envelope(beats * self.beat * filling)
         argenvelope = 0.5*legato*env + (1-legato)*env.apply_adsr(0.01,0.05,0.1, sustain_level=0.5)
-        return sum(Sine(freq*i) * 0.5 * 1./i for i in range(1, 5)) * argenvelope
+        return Additive(freq, (1, 2, 3, 4), (0.5, 0.25, 0.5/3, 0.125)) * argenvelope
 
 class HardDisk(Instrument):
     """
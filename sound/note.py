@@ -1,7 +1,7 @@
 from . import SAMPLE_RATE
-from .signal import ConstantSignal, Signal
+from .signal import ConstantSignal, Signal, Timeline
 
-__all__ = ('Note',)
+__all__ = ('Note', 'NoteTimeline')
 
 numty = (int, float)
 
@@ -28,6 +28,12 @@ class Note(Signal):
     def amplitude(self, frame):
         return self.src.amplitude(frame)
 
+    def amplitude_block(self, start, n):
+        return self.src.amplitude_block(start, n)
+
+    def amplitude_frames(self, frames):
+        return self.src.amplitude_frames(frames)
+
     def __add__(self, other):
         if other == 0:
             return self
@@ -58,3 +64,42 @@ class Note(Signal):
         if other == 0:
             other = self.value
         return Note(self.src % (other * self.beat / SAMPLE_RATE), float('inf'), self.beat)
+
+class NoteTimeline(Timeline):
+    """
+    A builder for sequences of notes, which works like `Timeline` except that times are
+    in beats. Use this instead of chaining `&` to build long melodies in linear time.
+    """
+    def __init__(self):
+        super(NoteTimeline, self).__init__()
+        self.value = 0
+        self.beat = None
+
+    def add(self, sig, time=0.):
+        """
+        Add a note to the timeline, starting at the given time.
+
+        :param sig:     The note to add
+        :param time:    The time to start the note at, in beats of that note. Optional,
+                        defaults to the beginning of the timeline.
+        """
+        realshift = time * sig.beat / SAMPLE_RATE
+        self._add(sig.src, int(realshift*SAMPLE_RATE))
+        self.value = max(self.value, sig.value + time)
+        self.beat = sig.beat
+        return self
+
+    def append(self, sig):
+        """
+        Add a note to the timeline, starting when everything added so far has ended.
+        This is the equivalent of the `&` operator.
+
+        :param sig:     The note to add
+        """
+        return self.add(sig, self.value)
+
+    def freeze(self) -> Note:
+        """
+        Return a note containing everything added to the timeline so far.
+        """
+        return Note(super(NoteTimeline, self).freeze(), self.value, self.beat)
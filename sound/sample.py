@@ -1,8 +1,8 @@
 import wave
-import struct
+import numpy
 
-from . import SAMPLE_RATE, sd
-from .signal import Signal
+from . import SAMPLE_RATE
+from .signal import Signal, _interpolate
 
 class RawData(Signal):
     """
@@ -11,6 +11,7 @@ class RawData(Signal):
     def __init__(self, data):
         self.data = data
         self.duration = len(data)
+        self._array = None
 
     def amplitude(self, frame):
         if frame < 0: return 0
@@ -19,22 +20,53 @@ class RawData(Signal):
         except IndexError:
             return 0
 
+    def _samples(self):
+        # data may be a list, so make it an array once rather than on every block. An array is
+        # used as it is, without copying it to float64.
+        if self._array is None:
+            self._array = numpy.asarray(self.data).reshape(-1)
+        return self._array
+
+    def amplitude_block(self, start, n):
+        out = numpy.zeros(n)
+        lo, hi = max(start, 0), min(start + n, self.duration)
+        if lo < hi:
+            out[lo-start:hi-start] = self._samples()[lo:hi]
+        return out
+
+    def amplitude_frames(self, frames):
+        return _interpolate(self._samples(), numpy.asarray(frames, dtype=float))
+
     @staticmethod
-    def from_file(filename):
+    def from_file(filename, dtype=numpy.float64):
         """
-        Make a new RawData by loading from a .wav file.
+        Make a new RawData by loading from a 16-bit .wav file. Multiple channels are mixed down
+        to one.
+
+        :param filename:    The file to load
+        :param dtype:       The numpy dtype to store the sample data in. Optional, defaults to
+                            float64. float32 halves the memory used, and is still far more
+                            precise than the 16-bit source.
         """
         fp = wave.open(filename)
         n = fp.getnframes()
-        bdata = fp.readframes(n)
-        idata = struct.unpack('h'*n, bdata)
-        fdata = [float(x)/(2**15 - 1) for x in idata]
-        return RawData(fdata)
+        channels = fp.getnchannels()
+        idata = numpy.frombuffer(fp.readframes(n), dtype='<i2').reshape(-1, channels)
+        fp.close()
+        fdata = idata.mean(axis=1) / (2**15 - 1)
+        return RawData(fdata.astype(dtype))
 
     @staticmethod
-    def record(seconds):
+    def record(seconds, sink=None):
         """
         Make a new RawData by recording from the microphone.
+
+        :param seconds: The length to record, in seconds
+        :param sink:    The `sound.sink.Sink` to record from. Optional, defaults to a new
+                        `DeviceSink` for the default audio device.
         """
-        data = sd.rec(seconds * SAMPLE_RATE, blocking=True)
+        from .sink import DeviceSink
+        if sink is None:
+            sink = DeviceSink()
+        data = sink.record(int(seconds * SAMPLE_RATE))[:, 0]
         return RawData(data)
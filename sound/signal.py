@@ -1,17 +1,472 @@
 # pylint: disable=superfluous-parens
-from typing import Optional
+from typing import Any, Hashable, Optional, Tuple
+import bisect
+import copy
+import math
 import numpy
-import struct
-import wave
 import asyncio
+import logging
+import threading
+from time import perf_counter
 
-import progressbar
-
-from . import SAMPLE_RATE, sd
+from . import SAMPLE_RATE
 
 numty = (int, float)
+logger = logging.getLogger('sound')
+
+# The number of frames rendered at once by `Signal.render` and friends.
+BLOCK_SIZE = 4096
+
+def _overlap(start, n, lo, hi):
+    """
+    Intersect the block of n frames beginning at start with the frame range [lo, hi).
+    Return the intersection as a pair of integer frames, which is empty if the first is not
+    less than the second.
+    """
+    if lo > start:
+        start_ = math.ceil(lo)
+    else:
+        start_ = start
+    if hi < start + n:
+        end = math.ceil(hi)
+    else:
+        end = start + n
+    return start_, end
+
+
+def _interpolate(data, frames):
+    """
+    Linearly interpolate the given array of sample data at the given fractional frames.
+    Frames outside the data are silent.
+    """
+    out = numpy.zeros(len(frames))
+    mask = (frames >= 0) & (frames < len(data))
+    if not mask.any():
+        return out
+    inside = frames[mask]
+    base = inside.astype(int)
+    following = numpy.zeros(len(base))
+    ok = base + 1 < len(data)
+    following[ok] = data[base[ok] + 1]
+    out[mask] = data[base] + (following - data[base]) * (inside - base)
+    return out
+
+
+class _IntervalIndex(object):
+    """
+    A static interval tree over a list of intervals [lo, hi) sorted by lo, which finds the
+    intervals overlapping a given range without looking at the rest of them.
+
+    The tree is implicit: the root of the subtree covering positions [a, b) is at position
+    (a+b)//2, and `max_hi` records the largest hi in each subtree.
+    """
+    def __init__(self, los, his):
+        self.los = list(los)
+        self.his = list(his)
+        self.max_hi = list(self.his)
+        self._build(0, len(self.los))
+
+    def _build(self, a, b):
+        if a >= b:
+            return float('-inf')
+        mid = (a + b) // 2
+        self.max_hi[mid] = max(self.his[mid], self._build(a, mid), self._build(mid + 1, b))
+        return self.max_hi[mid]
+
+    def query(self, lo, hi):
+        """
+        Return the positions of the intervals overlapping [lo, hi), in order.
+        """
+        out = []
+        self._query(0, len(self.los), lo, hi, out)
+        return out
+
+    def _query(self, a, b, lo, hi, out):
+        if a >= b:
+            return
+        mid = (a + b) // 2
+        if self.max_hi[mid] <= lo:
+            return
+        self._query(a, mid, lo, hi, out)
+        if self.los[mid] < hi:
+            if self.his[mid] > lo:
+                out.append(mid)
+            self._query(mid + 1, b, lo, hi, out)
+
+class _RingBuffer(object):
+    """
+    A ring buffer of samples with a single producer thread and a single consumer thread.
+    The producer only ever advances `head` and the consumer only ever advances `tail`, so
+    neither side needs to take a lock.
+    """
+    def __init__(self, capacity):
+        self.data = numpy.zeros((capacity,))
+        self.capacity = capacity
+        self.head = 0
+        self.tail = 0
+
+    def available(self):
+        """
+        Return the number of frames which can be pulled.
+        """
+        return self.head - self.tail
+
+    def space(self):
+        """
+        Return the number of frames which can be pushed.
+        """
+        return self.capacity - (self.head - self.tail)
+
+    def push(self, block):
+        """
+        Append a block of frames. The caller must check that there is enough space first.
+        """
+        n = len(block)
+        i = self.head % self.capacity
+        first = min(n, self.capacity - i)
+        self.data[i:i+first] = block[:first]
+        self.data[:n-first] = block[first:]
+        self.head += n
+
+    def pull(self, out):
+        """
+        Fill the start of out with as many frames as are available, up to its length.
+        Return the number of frames filled.
+        """
+        n = min(len(out), self.head - self.tail)
+        i = self.tail % self.capacity
+        first = min(n, self.capacity - i)
+        out[:first] = self.data[i:i+first]
+        out[first:n] = self.data[:n-first]
+        self.tail += n
+        return n
+
+class StreamStats(object):
+    """
+    Counters and timings for a live playback stream. `Signal.play_async` attaches one of these
+    to the stream it returns, as `stream.stats`.
+
+    :ivar callbacks:            The number of times the device has asked for audio.
+    :ivar frames:               The total number of frames handed to the device.
+    :ivar frames_per_callback:  A dict mapping the number of frames asked for in a callback to
+                                how many callbacks asked for that many.
+    :ivar callback_histogram:   A list counting callbacks by how long they took. Entry i counts
+                                the callbacks which took no longer than ``buckets[i]`` seconds
+                                (and longer than ``buckets[i-1]``).
+    :ivar callback_time:        The total time spent in callbacks, in seconds.
+    :ivar worst_callback:       The longest time spent in a single callback, in seconds.
+    :ivar blocks:               The number of blocks rendered.
+    :ivar rendered:             The total number of frames rendered.
+    :ivar render_time:          The total time spent rendering, in seconds.
+    :ivar worst_block:          The longest time spent rendering a single block, in seconds.
+    :ivar worst_block_frames:   The number of frames in that block.
+    :ivar underflows:           The number of callbacks flagged with an output underflow by the device.
+    :ivar overflows:            The number of callbacks flagged with an output overflow by the device.
+    :ivar starved:              The number of callbacks where the render-ahead buffer ran dry.
+    """
+    buckets = (0.0001, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, float('inf'))
+
+    def __init__(self):
+        self.callbacks = 0
+        self.frames = 0
+        self.frames_per_callback = {}
+        self.callback_histogram = [0] * len(self.buckets)
+        self.callback_time = 0.
+        self.worst_callback = 0.
+        self.blocks = 0
+        self.rendered = 0
+        self.render_time = 0.
+        self.worst_block = 0.
+        self.worst_block_frames = 0
+        self.underflows = 0
+        self.overflows = 0
+        self.starved = 0
+
+    def record_callback(self, frames, seconds, status=None):
+        """
+        Record a device callback.
+
+        :param frames:      The number of frames the device asked for
+        :param seconds:     How long the callback took
+        :param status:      The `sounddevice.CallbackFlags` the callback was given. Optional.
+        """
+        self.callbacks += 1
+        self.frames += frames
+        self.frames_per_callback[frames] = self.frames_per_callback.get(frames, 0) + 1
+        self.callback_histogram[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.callback_time += seconds
+        self.worst_callback = max(self.worst_callback, seconds)
+        if status:
+            if status.output_underflow:
+                self.underflows += 1
+            if status.output_overflow:
+                self.overflows += 1
+
+    def record_block(self, frames, seconds):
+        """
+        Record a block render.
+
+        :param frames:      The number of frames rendered
+        :param seconds:     How long the render took
+        """
+        self.blocks += 1
+        self.rendered += frames
+        self.render_time += seconds
+        if seconds > self.worst_block:
+            self.worst_block = seconds
+            self.worst_block_frames = frames
+
+    @property
+    def realtime_factor(self):
+        """
+        How many seconds of audio are rendered per second spent rendering. Anything below 1
+        can't keep up with the device.
+        """
+        if self.render_time == 0:
+            return float('inf')
+        return self.rendered / SAMPLE_RATE / self.render_time
+
+    def summary(self):
+        """
+        Return a one-line human-readable summary of these stats.
+        """
+        return '%d callbacks, %d frames, realtime factor %.2f, worst callback %.2fms, worst block %.2fms (%d frames), %d underflows, %d overflows, %d starved' % (
+            self.callbacks, self.frames, self.realtime_factor, self.worst_callback * 1000,
+            self.worst_block * 1000, self.worst_block_frames, self.underflows, self.overflows, self.starved)
+
+class RenderStats(object):
+    """
+    Levels and clipping measured over a render. Pass one to `Signal.render` or its friends and
+    read it afterwards, e.g. to reject or re-gain renders automatically.
+
+    :ivar frames:       The number of frames measured.
+    :ivar peak:         The largest absolute amplitude.
+    :ivar clipped:      The number of frames whose absolute amplitude was over 1.
+    :ivar first_clip:   The first frame whose absolute amplitude was over 1, or None.
+    :ivar gain:         The factor the output was scaled by to normalize it, or 1 if it wasn't.
+    """
+    def __init__(self):
+        self.frames = 0
+        self.peak = 0.
+        self.clipped = 0
+        self.first_clip = None
+        self.gain = 1.
+        self._sum_squares = 0.
+
+    def update(self, start, block):
+        """
+        Measure another block of output.
+
+        :param start:   The frame the block starts at
+        :param block:   The block, as a numpy array
+        """
+        if not len(block):
+            return
+        mag = numpy.abs(block)
+        self.frames += len(block)
+        self.peak = max(self.peak, float(mag.max()))
+        self._sum_squares += float(numpy.dot(block, block))
+        over = numpy.flatnonzero(mag > 1)
+        if len(over):
+            self.clipped += len(over)
+            if self.first_clip is None:
+                self.first_clip = start + int(over[0])
+
+    @property
+    def rms(self):
+        """
+        The root mean square amplitude, before any normalization.
+        """
+        return math.sqrt(self._sum_squares / self.frames) if self.frames else 0.
 
-__all__ = ('Signal', 'LoopSignal', 'DelaySignal', 'SequenceSignal', 'InvertSignal', 'ConstantSignal', 'MixSignal', 'EnvelopeSignal', 'Purifier', 'SliceSignal', 'ReverseSignal')
+class _NodeTimes(object):
+    """
+    The time spent in one node's `amplitude_block` and `amplitude_frames`, for `Profile`.
+    """
+    def __init__(self):
+        self.calls = 0
+        self.frames = 0
+        self.total = 0.
+        self.own = 0.
+        self.active = 0
+
+class Profile(object):
+    """
+    Records where the time goes while rendering. Pass one to `Signal.render` or
+    `Signal.render_iter`, then look at `report()` or `hot()`.
+
+    Every node that is evaluated through its own `amplitude_block` or `amplitude_frames` is
+    timed, both including and excluding the nodes underneath it. Where `compile` evaluates a
+    copy of a node, or purifies it automatically, the time is credited to the node in the graph
+    that was rendered. The mixing, enveloping and inverting which `compile`
+    turns into buffer operations is timed per kind of operation, since one operation can stand
+    for many nodes. Time spent in a node calling `amplitude` on its children, rather than
+    `amplitude_block`, counts as that node's own time.
+
+    A profile can be passed to more than one render, in which case all of its times add up
+    across them.
+
+    :ivar total:        The wall time of the whole render, in seconds.
+    :ivar operations:   A dict mapping the kinds of compiled operations to their total time.
+    """
+    _opnames = {1: 'constant', 2: 'mix', 3: 'multiply', 4: 'invert'}
+
+    def __init__(self):
+        self.root = None
+        self.total = 0.
+        self.operations = {}
+        self.nodes = {}
+        self._timed = []
+        self._patched = []
+        self._stack = []
+
+    def _attach(self, root, program):
+        """
+        Start timing every node that the given compiled program evaluates directly, and
+        everything underneath them.
+        """
+        self.root = root
+        program.profile = self
+        todo = [op[3][0] for op in program.ops if op[0] == _LEAF]
+        seen = set()
+        while todo:
+            node = todo.pop()
+            if id(node) in seen:
+                continue
+            seen.add(id(node))
+            original = program.originals.get(id(node), node)
+            times = self.nodes.get(id(original))
+            if times is None:
+                # the node is kept so its id can't be reused by another node
+                self.nodes[id(original)] = times = _NodeTimes()
+                self._timed.append(original)
+            self._patched.append(node)
+            node.amplitude_block = self._wrap(node.amplitude_block, times, lambda start, n: n)
+            node.amplitude_frames = self._wrap(node.amplitude_frames, times, len)
+            todo.extend(_children(node))
+
+    def _detach(self, program):
+        program.profile = None
+        for node in self._patched:
+            del node.__dict__['amplitude_block']
+            del node.__dict__['amplitude_frames']
+        self._patched = []
+
+    def _wrap(self, func, times, count):
+        stack = self._stack
+        def wrapper(*args):
+            t0 = perf_counter()
+            stack.append(0.)
+            times.active += 1
+            try:
+                return func(*args)
+            finally:
+                times.active -= 1
+                dt = perf_counter() - t0
+                times.own += dt - stack.pop()
+                # a call made while the same node is already being timed, like a purifier asking
+                # for the node it purifies or amplitude_block falling back on amplitude_frames,
+                # only adds to the own time
+                if not times.active:
+                    times.total += dt
+                    times.calls += 1
+                    times.frames += count(*args)
+                if stack:
+                    stack[-1] += dt
+        return wrapper
+
+    def _time(self, node):
+        """
+        Return the time spent in the given node including its children. Nodes which were
+        compiled away are credited with the time of the nodes underneath them.
+        """
+        times = self.nodes.get(id(node))
+        if times is not None:
+            return times.total
+        return sum(self._time(child) for child in _children(node))
+
+    def by_class(self):
+        """
+        Return a dict mapping class names to tuples of (own time, calls, frames), summed over
+        every timed node of that class.
+        """
+        out = {}
+        for node in self._nodes():
+            times = self.nodes[id(node)]
+            own, calls, frames = out.get(type(node).__name__, (0., 0, 0))
+            out[type(node).__name__] = (own + times.own, calls + times.calls, frames + times.frames)
+        return out
+
+    def _nodes(self):
+        seen = set()
+        todo = [self.root] + self._timed
+        while todo:
+            node = todo.pop()
+            if id(node) in seen:
+                continue
+            seen.add(id(node))
+            if id(node) in self.nodes:
+                yield node
+            todo.extend(_children(node))
+
+    def hot(self, count=10):
+        """
+        Return the nodes which spent the most time on their own, as a list of tuples of
+        (description, fraction of the total render time). The description says where the node
+        sits in the graph, e.g. ``FMFilter under Note #14 under SequenceSignal``.
+
+        :param count:   The number of nodes to return. Optional.
+        """
+        paths = {}
+        todo = [(self.root, type(self.root).__name__)]
+        while todo:
+            node, path = todo.pop()
+            if id(node) in paths:
+                continue
+            paths[id(node)] = path
+            children = _children(node)
+            for i, child in enumerate(children):
+                label = type(child).__name__ if len(children) == 1 else '%s #%d' % (type(child).__name__, i)
+                todo.append((child, '%s under %s' % (label, path)))
+        ranked = sorted(self._nodes(), key=lambda node: -self.nodes[id(node)].own)[:count]
+        return [(paths.get(id(node), type(node).__name__), self.nodes[id(node)].own / self.total if self.total else 0.) for node in ranked]
+
+    def report(self, threshold=0.01):
+        """
+        Return a human-readable report of the render as an indented tree mirroring the signal
+        graph. Each line gives a node's share of the render time including its children, and
+        for timed nodes, its own share, call count and frame count. A node which appears in
+        several places in the graph is only expanded the first time.
+
+        :param threshold:   Leave out subtrees which took less than this fraction of the render
+                            time. Optional.
+        """
+        total = self.total or 1.
+        lines = ['total %.3fs' % self.total]
+        for name, seconds in sorted(self.operations.items(), key=lambda item: -item[1]):
+            lines.append('compiled %s: %.1f%%' % (name, seconds / total * 100))
+        seen = set()
+        todo = [(self.root, 0, '')]
+        while todo:
+            node, depth, label = todo.pop()
+            seconds = self._time(node)
+            if seconds / total < threshold:
+                continue
+            line = '%s%s%s: %.1f%%' % ('  ' * depth, label, type(node).__name__, seconds / total * 100)
+            times = self.nodes.get(id(node))
+            if times is not None:
+                line += ' (own %.1f%%, %d calls, %d frames)' % (times.own / total * 100, times.calls, times.frames)
+            if id(node) in seen:
+                lines.append(line + ' (shared, see above)')
+                continue
+            seen.add(id(node))
+            lines.append(line)
+            children = _children(node)
+            for i, child in reversed(list(enumerate(children))):
+                todo.append((child, depth + 1, '' if len(children) == 1 else '#%d ' % i))
+        return '\n'.join(lines)
+
+__all__ = ('Signal', 'LoopSignal', 'DelaySignal', 'SequenceSignal', 'InvertSignal', 'ConstantSignal', 'MixSignal', 'EnvelopeSignal', 'Purifier', 'SliceSignal', 'ReverseSignal', 'Timeline', 'Program', 'StreamStats', 'Profile', 'RenderStats')
 
 class Signal(object):
     """
@@ -40,98 +495,333 @@ class Signal(object):
 
     Additionally, you may use array slice notation to extract slices of sample data.
     The slice bounds are in seconds. Normal array indexing does not do anything.
+
+    Sample data can be accessed one frame at a time with `amplitude`, or a block of frames
+    at a time with `amplitude_block`. Rendering goes through the latter, so subclasses which
+    can compute many frames at once with numpy should override it.
     """
     # pylint: disable=unused-argument,no-self-use
 
-    def play(self, length: Optional[float]=None, progress=False):
+    def play(self, length: Optional[float]=None, progress=False, stream=False, sample_rate=SAMPLE_RATE, sink=None):
         """
         Play this signal. Block until playback is complete.
         If the given signal is infinitely long, default to three seconds of playback.
 
         :param length:      The length to play, in seconds. Optional.
         :param progress:    Whether to show a progress bar for rendering
+        :param stream:      Whether to play each chunk as soon as it is rendered, instead of
+                            rendering everything first. This keeps memory use constant, but
+                            playback will stutter if rendering is slower than realtime.
+        :param sample_rate: The sample rate to play at, see `render_iter`. Optional.
+        :param sink:        The `sound.sink.Sink` to play to. It is opened at the sample rate and
+                            closed once playback is complete. Optional, defaults to a new
+                            `DeviceSink` for the default audio device.
+        """
+        from .sink import DeviceSink
+        if sink is None:
+            sink = DeviceSink()
+        with sink:
+            sink.open(sample_rate)
+            if stream:
+                self._send(sink, length, progress, sample_rate=sample_rate)
+            else:
+                sink.write(self.render(length, progress, sample_rate=sample_rate))
+
+    def _send(self, sink, length, progress, stats=None, sample_rate=SAMPLE_RATE):
         """
-        data = self.render(length, progress)
-        sd.play(data, blocking=True)
+        Write this signal to an open sink as it is rendered, then drain it.
+        """
+        for chunk in self.render_iter(length, progress=progress, stats=stats, sample_rate=sample_rate):
+            sink.write(chunk)
+        sink.drain()
 
-    async def aplay(self, length: Optional[float]=None):
+    async def aplay(self, length: Optional[float]=None, sink=None):
         """
         Play this signal. Block (but asyncio yield) until playback is complete.
         If the given signal is infinitely long, default to three seconds of playback.
 
+        By default, all calls to `aplay` are mixed together into one shared output stream (see
+        `sound.asyncplayer.shared_mixer`), and this coroutine finishes when the device has been
+        handed the last frame. Cancelling it mutes the signal straight away.
+
         :param length:      The length to play, in seconds. Optional.
+        :param sink:        An object to write the sample data to instead of the shared stream,
+                            e.g. a `sound.sink.Sink` or a `WaveWriter`. Its ``write`` method is called with each rendered
+                            chunk, as a numpy array of floats, on an executor thread, and isn't
+                            called again until the previous call returns. Optional.
         """
-        data = await asyncio.get_event_loop().run_in_executor(None, self.render, length, False)
-        sd
+        loop = asyncio.get_event_loop()
+        if sink is not None:
+            it = self.render_iter(length)
+            def step():
+                chunk = next(it, None)
+                if chunk is not None:
+                    sink.write(chunk)
+                return chunk is not None
+            while await loop.run_in_executor(None, step):
+                pass
+            return
+
+        from .asyncplayer import shared_mixer
+        mixer = shared_mixer()
+        frames = self._render_length(length)
+        sig = SliceSignal(self, 0, frames / SAMPLE_RATE)
+        done = loop.create_future()
+        def finish():
+            if not done.done():
+                done.set_result(None)
+        def notify():
+            # runs on the render thread, which shouldn't die because the loop has gone away
+            try:
+                loop.call_soon_threadsafe(finish)
+            except RuntimeError:
+                pass
+        mixer.play_then(sig, notify)
+        try:
+            await done
+        except asyncio.CancelledError:
+            mixer.mute(sig)
+            mixer.unqueue(notify)
+            raise
 
-    def play_async(self):
+    def play_async(self, blocksize=0, latency=None, ahead=0, log_interval=None, sink=None):
         """
-        Play this signal asynchronously. Return the `sounddevice` stream object for this playback.
+        Play this signal asynchronously. Return the stream object for this playback, made by
+        `sound.sink.Sink.stream`; for the audio device, that's a `sounddevice` stream.
         The only way you should ever really have to interact with the return value of this function is
-        to call `.stop()` on it.
-
-        :param thing:       The signal to play
+        to call `.stop()` on it, or to look at its `stats` attribute, a `StreamStats` object which
+        is updated as playback goes on.
+
+        Each buffer the device asks for is filled with a single block render.
+
+        :param blocksize:       The number of frames per device buffer, passed through to the stream.
+                                Optional, defaults to letting the device choose.
+        :param latency:         The stream latency, passed through to the stream. Optional.
+        :param ahead:           The number of buffers to keep rendered ahead of the device. If nonzero,
+                                rendering happens on a background thread into a ring buffer, the
+                                audio callback only copies out of it, and blocksize defaults to
+                                BLOCK_SIZE. Ignored for sinks which aren't realtime, which wait
+                                for each block to be rendered anyway. Optional.
+        :param log_interval:    If given, log a summary of the stream stats every this many seconds
+                                to the ``sound`` logger at INFO level. Optional.
+        :param sink:            The `sound.sink.Sink` to play to. Any other sink than a `DeviceSink`
+                                is fed from a background thread as fast as it takes the data.
+                                Optional, defaults to a new `DeviceSink` for the default audio device.
+
+        With render-ahead, anything that changes what this signal sounds like, e.g. calling
+        `AsyncPlayer.play`, is heard at most ``(ahead + 1) * blocksize`` frames plus the device
+        latency later: it takes effect at the next block the producer renders, and everything
+        already in the ring buffer plays first.
         """
-        def cb(outdata, frames, time, status):  # pylint: disable=unused-argument
-            nonlocal timer
-            startframe = timer
-            for i in range(frames):
-                outdata[i] = self.amplitude(i+startframe)
-            timer += frames
-            if timer >= self.duration:
-                raise sd.CallbackStop
-
-        stream = sd.OutputStream(callback=cb)
+        from .sink import DeviceSink, CallbackStop
+        if sink is None:
+            sink = DeviceSink()
+        program = compile(self)
+        duration = self.duration if self.duration == float('inf') else int(self.duration)
         timer = 0
+        stats = StreamStats()
+        done = threading.Event()
+
+        def render(n):
+            nonlocal timer
+            t0 = perf_counter()
+            block = numpy.zeros((n,))
+            m = int(min(n, duration - timer))
+            if m > 0:
+                block[:m] = program.amplitude_block(timer, m)
+            timer += n
+            stats.record_block(n, perf_counter() - t0)
+            return block
+
+        if not ahead or not sink.realtime:
+            def cb(outdata, frames, time, status):  # pylint: disable=unused-argument
+                t0 = perf_counter()
+                remaining = duration - timer
+                outdata[:, 0] = render(frames)
+                stats.record_callback(frames, perf_counter() - t0, status)
+                if timer >= duration:
+                    raise CallbackStop(max(0, int(remaining)))
+        else:
+            if not blocksize:
+                blocksize = BLOCK_SIZE
+            ring = _RingBuffer(ahead * blocksize)
+            finished = False
+
+            def produce():
+                nonlocal finished
+                while not done.is_set() and timer < duration:
+                    if ring.space() < blocksize:
+                        done.wait(blocksize / SAMPLE_RATE / 4)
+                    else:
+                        ring.push(render(blocksize))
+                finished = True
+
+            def cb(outdata, frames, time, status):  # pylint: disable=unused-argument
+                t0 = perf_counter()
+                n = ring.pull(outdata[:, 0])
+                if n < frames:
+                    # either we're out of signal or the producer fell behind. play silence for the rest
+                    outdata[n:] = 0
+                    if finished and ring.available() == 0:
+                        stats.record_callback(frames, perf_counter() - t0, status)
+                        raise CallbackStop(n)
+                    stats.starved += 1
+                stats.record_callback(frames, perf_counter() - t0, status)
+
+            threading.Thread(target=produce, daemon=True).start()
+
+        if log_interval:
+            def report():
+                while not done.wait(log_interval):
+                    logger.info(stats.summary())
+                logger.info(stats.summary())
+            threading.Thread(target=report, daemon=True).start()
+
+        # the stream's type depends on the sink, so it's told about its stats here
+        stream: Any = sink.stream(cb, blocksize=blocksize, latency=latency, finished_callback=done.set)
+        stream.stats = stats
         stream.start()
         return stream
 
-    def write(self, filename, length=None, progress=True):
+    def write(self, filename, length=None, progress=True, sample_format='int16', stats=None, sample_rate=SAMPLE_RATE):
+        """
+        Write this signal to a .wav file. Sample data is written as it is rendered.
+
+        :param filename:        The filename or binary file object to write to. Regardless of its
+                                extension, the output filetype will be uncompressed .wav
+        :param length:          The length to write, in seconds. Optional.
+        :param progress:        Whether to show a progress bar for rendering
+        :param sample_format:   One of "int16", "int24", or "float32". Optional, defaults to int16.
+        :param stats:           A `RenderStats` object to record levels and clipping in. Optional.
+        :param sample_rate:     The sample rate to write at, see `render_iter`. Optional.
         """
-        Write this signal to a .wav file.
+        from .sink import WaveSink
+        with WaveSink(filename, sample_format) as sink:
+            sink.open(sample_rate)
+            self._send(sink, length, progress, stats, sample_rate)
 
-        :param filename:    The filename to write to. Regardless of its extension, the output filetype
-                            will be uncompressed .wav
-        :param thing:       The signal to write
+    def pipe(self, fp=None, length=None, progress=False, sample_format='int16', stats=None, sample_rate=SAMPLE_RATE):
+        """
+        Write this signal to a binary file object as raw little-endian mono PCM, for example to
+        hand it off to an encoder. Sample data is written as it is rendered.
+
+        :param fp:              The file object to write to. Optional, defaults to stdout.
+        :param length:          The length to write, in seconds. Optional.
+        :param progress:        Whether to show a progress bar for rendering
+        :param sample_format:   One of "int16", "int24", or "float32". Optional, defaults to int16.
+        :param stats:           A `RenderStats` object to record levels and clipping in. Optional.
+        :param sample_rate:     The sample rate to write at, see `render_iter`. Optional.
         """
-        data = self.render(length, progress)
-        mm = 2**15 - 1
-        fp = wave.open(filename, 'w')
-        fp.setparams((1, 2, 44100, 63822, 'NONE', 'not compressed'))
-        fp.writeframes(b''.join(struct.pack('h', int(max(min(dat, 1), -1)*mm)) for dat in data))
-        fp.close()
+        from .sink import PipeSink
+        with PipeSink(fp, sample_format) as sink:
+            sink.open(sample_rate)
+            self._send(sink, length, progress, stats, sample_rate)
 
-    def render(self, length=None, progress=False, clip_warn=True):
+    def render(self, length=None, progress=False, clip_warn=True, profile=None, stats=None, normalize=False, dtype=numpy.float64, sample_rate=SAMPLE_RATE):
         """
         Render this signal into an numpy array of floats. Return the array.
 
         :param length:      The length to render, in seconds. Optional.
         :param progress:    Whether to show a progress bar for rendering
+        :param clip_warn:   Whether to clamp the output to [-1, 1] and warn if that was necessary
+        :param profile:     A `Profile` object to record where the rendering time goes. Optional.
+        :param stats:       A `RenderStats` object to record levels and clipping in. Optional.
+        :param normalize:   Whether to scale the whole output down to fit in [-1, 1] instead of
+                            clamping it, if it doesn't already. Optional.
+        :param dtype:       The numpy dtype to render in, see `render_iter`. Optional.
+        :param sample_rate: The sample rate to render at, see `render_iter`. Optional.
         """
-        if progress and not progressbar:
-            print('Install the progressbar module to see a progress bar for rendering')
-            progress = False
-
-        duration = self.duration if length is None else length * SAMPLE_RATE
-        if duration == float('inf'):
-            duration = 3*SAMPLE_RATE
-        else:
-            duration = int(duration)
-        out = numpy.empty((duration,))
-
-        pbar = progressbar.ProgressBar(widgets=['Rendering: ', progressbar.Percentage(), ' ', progressbar.Bar(), ' ', progressbar.ETA()], maxval=duration-1).start() if progress else None
+        if stats is None and normalize:
+            stats = RenderStats()
+        out = numpy.empty((self._render_length(length, sample_rate),), dtype=dtype)
+        start = 0
+        for chunk in self.render_iter(length, progress=progress, clip_warn=clip_warn and not normalize, profile=profile, stats=stats, dtype=dtype, sample_rate=sample_rate):
+            out[start:start+len(chunk)] = chunk
+            start += len(chunk)
+        if normalize and stats is not None and stats.peak > 1:
+            stats.gain = 1 / stats.peak
+            out *= stats.gain
+        return out
 
+    def render_iter(self, length=None, chunk_frames=BLOCK_SIZE, progress=False, clip_warn=True, profile=None, stats=None, dtype=numpy.float64, sample_rate=SAMPLE_RATE):
+        """
+        Render this signal one chunk at a time. Return a generator of numpy arrays of floats, all
+        of which are chunk_frames long except possibly the last. Memory use does not depend on
+        the length rendered.
+
+        :param length:          The length to render, in seconds. Optional.
+        :param chunk_frames:    The number of frames in each chunk. Optional.
+        :param progress:        Whether to show a progress bar for rendering
+        :param clip_warn:       Whether to clamp the output to [-1, 1] and warn if that was necessary
+        :param profile:         A `Profile` object to record where the rendering time goes. Optional.
+        :param stats:           A `RenderStats` object to record levels and clipping in, before
+                                any clamping. Optional.
+        :param dtype:           The numpy dtype to render in. Optional, defaults to float64.
+        :param sample_rate:     The sample rate to render at. Optional, defaults to SAMPLE_RATE.
+
+        Rendering in float32 halves the memory used by the output, by the buffers that mixing
+        and enveloping work in, and by any purifiers added automatically. Oscillators and
+        filters still compute in float64, and their output is rounded once as it's stored.
+        Each rounding step adds a relative error of at most 2**-24, about 6e-8, while one step
+        of 16-bit output is about 3e-5. So unless a frame passes through hundreds of mixing or
+        enveloping steps, 16-bit output only differs from a float64 render by one step, in the
+        rare frames which fall right on the boundary between two steps.
+
+        Signal graphs are always built in frames at SAMPLE_RATE. Rendering at another sample
+        rate samples the graph at that rate instead, so the same graph can be rendered quickly
+        at 11025 Hz to preview it and at 48000 Hz to deliver it. Oscillators, envelopes and
+        everything else pure are evaluated exactly at the new rate's frame times. Impure nodes,
+        like filters and plucked strings, only exist at SAMPLE_RATE, so they are rendered at
+        that rate, cached, and interpolated linearly, which costs memory for the length of the
+        render and doesn't filter out anything above the new rate's Nyquist frequency.
+        """
+        duration = self._render_length(length, sample_rate)
+        pbar = None
+        if progress:
+            try:
+                import progressbar  # pylint: disable=import-outside-toplevel
+            except ImportError:
+                print('Install the progressbar module to see a progress bar for rendering')
+            else:
+                pbar = progressbar.ProgressBar(widgets=['Rendering: ', progressbar.Percentage(), ' ', progressbar.Bar(), ' ', progressbar.ETA()], maxval=duration-1).start()
+
+        program = compile(self, dtype, sample_rate)
+        if profile is not None:
+            profile._attach(self, program)
         clipped = 0
-        for i in range(duration):
-            out[i] = self.amplitude(i)
-            if pbar: pbar.update(i)
-            if clip_warn and abs(out[i]) > 1:
-                clipped = max(abs(out[i]), clipped)
-                out[i] = 1 if out[i] > 0 else -1
+        try:
+            for start in range(0, duration, chunk_frames):
+                n = min(chunk_frames, duration - start)
+                t0 = perf_counter()
+                out = program.amplitude_block(start, n)
+                if profile is not None:
+                    profile.total += perf_counter() - t0
+                if stats is not None:
+                    stats.update(start, out)
+                if clip_warn:
+                    peak = numpy.max(numpy.abs(out))
+                    if peak > 1:
+                        clipped = max(peak, clipped)
+                        numpy.clip(out, -1, 1, out=out)
+                if pbar: pbar.update(start + n - 1)
+                yield out
+        finally:
+            if profile is not None:
+                profile._detach(program)
         if pbar: pbar.finish()
+
         if clip_warn and clipped != 0:
             print('Warning: clipping! max val %s' % clipped)
-        return out
+
+    def _render_length(self, length, sample_rate=SAMPLE_RATE):
+        """
+        Return the number of frames at the given sample rate to render for the given length in
+        seconds, or None.
+        """
+        duration = self.duration * sample_rate / SAMPLE_RATE if length is None else length * sample_rate
+        if duration == float('inf'):
+            return 3*sample_rate
+        return int(duration)
 
     def amplitude(self, frame: int) -> float:
         """
@@ -142,6 +832,42 @@ class Signal(object):
         """
         return 0.
 
+    def amplitude_block(self, start: int, n: int) -> numpy.ndarray:
+        """
+        The block interface for accessing sample data. Return a numpy array of the amplitudes of
+        the n frames beginning at the given frame. The default calls `amplitude_frames` if the
+        subclass overrides it, and `amplitude` once per frame otherwise. Subclasses should
+        override one of the three if they can do better than that.
+
+        :param start:       The first frame whose amplitude should be returned.
+        :param n:           The number of frames to return.
+        """
+        if type(self).amplitude_frames is not Signal.amplitude_frames:
+            return self.amplitude_frames(numpy.arange(start, start + n, dtype=float))
+        return numpy.fromiter((self.amplitude(frame) for frame in range(start, start + n)), float, n)
+
+    def amplitude_frames(self, frames: numpy.ndarray) -> numpy.ndarray:
+        """
+        Return a numpy array of the amplitudes at each of the given frames, which need not be
+        contiguous, in order, or even integers. This is only meaningful for pure signals. The
+        default calls `amplitude` once per frame.
+
+        :param frames:      A numpy array of the frames whose amplitudes should be returned.
+        """
+        return numpy.fromiter((self.amplitude(frame) for frame in frames), float, len(frames))
+
+    def cache_key(self) -> Hashable:
+        """
+        Return a hashable value identifying the output of this signal. Two signals with equal
+        keys must produce exactly the same sample data, which lets rendering compute them only
+        once. The default is unique to this object. Subclasses whose output is entirely
+        determined by their parameters may override this to return those parameters.
+
+        A key is only used for instances of exactly the class that defines it, since a further
+        subclass may have parameters its parent doesn't know about.
+        """
+        return id(self)
+
     duration = 0
     pure = True
 
@@ -213,17 +939,54 @@ class Signal(object):
         else:
             raise KeyError(key)
 
-    def purify(self, preprocess=False) -> "Signal":
+    def stats(self) -> dict:
+        """
+        Describe the size and expected cost of this signal's graph, without rendering anything.
+        Return a dict with these keys:
+
+        - ``nodes``: The number of distinct nodes in the graph.
+        - ``by_class``: A dict mapping class names to the number of nodes of that class.
+        - ``depth``: The length of the longest path from this node down to a leaf.
+        - ``shared``: The number of nodes which are a child of more than one node, or more than
+          once of the same node.
+        - ``impure``: The number of impure nodes, which have to be evaluated in order.
+        - ``impure_reused``: The number of impure nodes which are heard more than once, and which
+          rendering will purify automatically.
+        - ``scalar``: The number of nodes without a block implementation, which are evaluated
+          one frame at a time.
+        - ``purifiers``: A list of the sizes of the buffers held by `Purifier` nodes, in bytes.
+        - ``cost``: A rough estimate of the work per output frame, in units of one numpy pass
+          over a buffer. Nodes evaluated one frame at a time count as `SCALAR_COST` units.
+        """
+        return _graph_stats(self)
+
+    def explain(self) -> str:
+        """
+        Return a human-readable summary of `stats`.
+        """
+        stats = self.stats()
+        by_class = sorted(stats['by_class'].items(), key=lambda item: (-item[1], item[0]))
+        return '\n'.join((
+            '%d nodes, depth %d, %d shared' % (stats['nodes'], stats['depth'], stats['shared']),
+            'by class: ' + ', '.join('%s %d' % item for item in by_class),
+            'impure: %d (%d heard more than once, which will be purified when rendered)' % (stats['impure'], stats['impure_reused']),
+            'purifiers: %d, %d bytes buffered' % (len(stats['purifiers']), sum(stats['purifiers'])),
+            'estimated cost: %.1f per frame (%d nodes are evaluated one frame at a time)' % (stats['cost'], stats['scalar']),
+        ))
+
+    def purify(self, preprocess=False, dtype=numpy.float64) -> "Signal":
         """
         Return a pure version of this signal. This is a no-op for pure signals, but for
         impure signals it installs a caching layer on top of the signal.
 
         :param preprocess:      Whether the cache should preload the sample data at initialize-time.
                                 Optional.
+        :param dtype:           The numpy dtype to cache the sample data in. Optional, defaults
+                                to float64. float32 halves the memory used.
         """
         if not preprocess and self.pure:
             return self
-        return Purifier(self, preprocess=preprocess)
+        return Purifier(self, preprocess=preprocess, dtype=dtype)
 
     def reverse(self) -> "Signal":
         """
@@ -252,6 +1015,20 @@ class LoopSignal(Signal):
 
         return out
 
+    def amplitude_block(self, start, n):
+        if self.length == float('inf') or self.length != int(self.length):
+            return super(LoopSignal, self).amplitude_block(start, n)
+        length = int(self.length)
+        out = numpy.zeros(n)
+
+        # each loop iteration is a copy of the child delayed by a multiple of the loop length
+        first = 0 if self.src.duration == float('inf') else max(0, int((start - self.src.duration) // length))
+        for copy_start in range(first * length, start + n, length):
+            lo, hi = _overlap(start, n, copy_start, copy_start + self.src.duration)
+            if lo < hi:
+                out[lo-start:hi-start] += self.src.amplitude_block(lo - copy_start, hi - lo)
+        return out
+
 class DelaySignal(Signal):
     """
     A signal that delays its child by n seconds
@@ -268,6 +1045,14 @@ class DelaySignal(Signal):
     def amplitude(self, frame):
         return self.src.amplitude(frame - self.delay)
 
+    def amplitude_block(self, start, n):
+        if self.delay != int(self.delay):
+            return super(DelaySignal, self).amplitude_block(start, n)
+        return self.src.amplitude_block(start - int(self.delay), n)
+
+    def amplitude_frames(self, frames):
+        return self.src.amplitude_frames(frames - self.delay)
+
     def __rshift__(self, other):
         if type(other) not in numty:
             raise TypeError("Can't shift by %s" % repr(other))
@@ -284,6 +1069,10 @@ class SequenceSignal(Signal):
     A sequence of signals starting at specific points in time.
     Ultimately used as an optimization for combinations of the `>>`, `&`, and `+` operators.
     """
+    # the number of signals up to which `amplitude` looks through all of them instead of using
+    # the interval index
+    _scan_limit = 64
+
     def __init__(self, *data):
         """
         data is a sequence of tuples of (Signal, starttime)
@@ -296,15 +1085,40 @@ class SequenceSignal(Signal):
         self.srcs = sorted(((src, start, start + src.duration) for src, start in data), key=lambda x: x[1])
         self.duration = max(src[2] for src in self.srcs)
         self.pure = all(src[0].pure for src in self.srcs)
+        self._index = None
+
+    def active(self, start, end):
+        """
+        Return the (Signal, starttime, endtime) tuples which are playing at any point in the
+        frame range [start, end), in order of starttime.
+        """
+        if self._index is None:
+            self._index = _IntervalIndex((start for _, start, _ in self.srcs), (end for _, _, end in self.srcs))
+        return [self.srcs[i] for i in self._index.query(start, end)]
 
     def amplitude(self, frame):
-        # TODO: optimize this maybe?
+        # querying the index costs more than it saves for a frame of a short sequence
+        srcs = self.srcs if len(self.srcs) <= self._scan_limit else self.active(frame, frame + 1)
         out = 0.
-        for src, start, end in self.srcs:
-            if frame >= start and frame < end:
+        for src, start, end in srcs:
+            if start > frame:
+                break
+            if frame < end:
                 out += src.amplitude(frame - start)
         return out
 
+    def amplitude_block(self, start, n):
+        out = numpy.zeros(n)
+        for src, src_start, src_end in self.active(start, start + n):
+            if src_start != int(src_start):
+                out += numpy.fromiter((src.amplitude(frame - src_start) if src_start <= frame < src_end else 0.
+                                       for frame in range(start, start + n)), float, n)
+                continue
+            lo, hi = _overlap(start, n, src_start, src_end)
+            if lo < hi:
+                out[lo-start:hi-start] += src.amplitude_block(lo - int(src_start), hi - lo)
+        return out
+
     def __rshift__(self, other):
         if type(other) not in numty:
             raise TypeError("Can't shift by %s" % repr(other))
@@ -330,6 +1144,12 @@ class InvertSignal(Signal):
     def amplitude(self, frame):
         return -self.src.amplitude(frame)
 
+    def amplitude_block(self, start, n):
+        return -self.src.amplitude_block(start, n)
+
+    def amplitude_frames(self, frames):
+        return -self.src.amplitude_frames(frames)
+
     def __neg__(self):
         return self.src
 
@@ -345,6 +1165,15 @@ class ConstantSignal(Signal):
     def amplitude(self, frame):
         return self._amplitude
 
+    def amplitude_block(self, start, n):
+        return numpy.full(n, self._amplitude, dtype=float)
+
+    def amplitude_frames(self, frames):
+        return numpy.full(len(frames), self._amplitude, dtype=float)
+
+    def cache_key(self):
+        return (ConstantSignal, self._amplitude)
+
     @staticmethod
     def wrap(val):
         if type(val) in numty:
@@ -368,6 +1197,18 @@ class MixSignal(Signal):
     def amplitude(self, frame):
         return sum(s.amplitude(frame) for s in self.signals)
 
+    def amplitude_block(self, start, n):
+        out = numpy.zeros(n)
+        for s in self.signals:
+            out += s.amplitude_block(start, n)
+        return out
+
+    def amplitude_frames(self, frames):
+        out = numpy.zeros(len(frames))
+        for s in self.signals:
+            out += s.amplitude_frames(frames)
+        return out
+
     def __add__(self, other):
         if type(other) is MixSignal:
             return MixSignal(self.signals + other.signals)
@@ -386,11 +1227,17 @@ class EnvelopeSignal(Signal):
     def amplitude(self, frame):
         return self.src.amplitude(frame)*self.env.amplitude(frame)
 
+    def amplitude_block(self, start, n):
+        return self.src.amplitude_block(start, n)*self.env.amplitude_block(start, n)
+
+    def amplitude_frames(self, frames):
+        return self.src.amplitude_frames(frames)*self.env.amplitude_frames(frames)
+
 class Purifier(Signal):
     """
-    A signal that caches its child's amplitude data
+    A signal that caches its child's amplitude data in a numpy array
     """
-    def __init__(self, src, length=None, preprocess=False):
+    def __init__(self, src, length=None, preprocess=False, dtype=numpy.float64):
         if length is None:
             if src.duration == float('inf') and preprocess:
                 raise ValueError("Cannot purify an infinite number of samples")
@@ -399,23 +1246,64 @@ class Purifier(Signal):
             length = int(length * SAMPLE_RATE)
         self.nextf = 0
         self.duration = length
-        self.storage = [0.]*(100000 if self.duration == float('inf') else int(self.duration))
+        self.dtype = dtype
+        self.storage = numpy.zeros(100000 if self.duration == float('inf') else math.ceil(self.duration), dtype=dtype)
         self.pure = True
         self.src = src
 
         if preprocess:
-            self.amplitude(self.duration - 1)
+            total = math.ceil(self.duration)
+            for start in range(0, total, BLOCK_SIZE):
+                self.amplitude_block(start, min(BLOCK_SIZE, total - start))
+
+    def _reserve(self, frames):
+        """
+        Make sure the storage has room for at least the given number of frames.
+        """
+        if frames > len(self.storage):
+            storage = numpy.zeros(max(frames, 2*len(self.storage)), dtype=self.dtype)
+            storage[:self.nextf] = self.storage[:self.nextf]
+            self.storage = storage
 
     def amplitude(self, frame):
         if frame < 0: return 0.
         if frame >= self.duration: return 0.
-        while frame >= self.nextf:
-            if self.nextf >= len(self.storage):
-                self.storage += [0.]*100000
-            self.storage[self.nextf] = self.src.amplitude(self.nextf)
-            self.nextf += 1
+        if frame != int(frame):
+            return self.amplitude_frames(numpy.array([frame]))[0]
+        frame = int(frame)
+        if frame >= self.nextf:
+            self._reserve(frame + 1)
+            while frame >= self.nextf:
+                self.storage[self.nextf] = self.src.amplitude(self.nextf)
+                self.nextf += 1
         return self.storage[frame]
 
+    def amplitude_block(self, start, n):
+        out = numpy.zeros(n)
+        lo, hi = _overlap(start, n, 0, self.duration)
+        if lo >= hi:
+            return out
+        if hi > self.nextf:
+            self._reserve(hi)
+            self.storage[self.nextf:hi] = self.src.amplitude_block(self.nextf, hi - self.nextf)
+            self.nextf = hi
+        out[lo-start:hi-start] = self.storage[lo:hi]
+        return out
+
+    def amplitude_frames(self, frames):
+        # fill the cache up to the frame after the last one asked for, then interpolate
+        frames = numpy.asarray(frames, dtype=float)
+        inside = frames[(frames >= 0) & (frames < self.duration)]
+        if len(inside):
+            hi = int(inside.max()) + 2
+            if hi > self.duration:
+                hi = math.ceil(self.duration)
+            if hi > self.nextf:
+                self._reserve(hi)
+                self.storage[self.nextf:hi] = self.src.amplitude_block(self.nextf, hi - self.nextf)
+                self.nextf = hi
+        return _interpolate(numpy.asarray(self.storage[:self.nextf]), frames)
+
 class SliceSignal(Signal):
     """
     A signal that extracts a slice of its child
@@ -438,6 +1326,20 @@ class SliceSignal(Signal):
         if frame >= self.duration: return 0
         return self.src.amplitude(frame + self.from_frame)
 
+    def amplitude_block(self, start, n):
+        out = numpy.zeros(n)
+        lo, hi = _overlap(start, n, 0, self.duration)
+        if lo < hi:
+            out[lo-start:hi-start] = self.src.amplitude_block(lo + self.from_frame, hi - lo)
+        return out
+
+    def amplitude_frames(self, frames):
+        out = numpy.zeros(len(frames))
+        mask = (frames >= 0) & (frames < self.duration)
+        if mask.any():
+            out[mask] = self.src.amplitude_frames(frames[mask] + self.from_frame)
+        return out
+
 class ReverseSignal(Signal):
     """
     A signal that reverses its child
@@ -449,5 +1351,602 @@ class ReverseSignal(Signal):
     def amplitude(self, frame):
         return self.src.amplitude(self.duration - frame - 1)
 
+    def amplitude_block(self, start, n):
+        if self.duration == float('inf') or self.duration != int(self.duration):
+            return super(ReverseSignal, self).amplitude_block(start, n)
+        return self.src.amplitude_block(int(self.duration) - start - n, n)[::-1]
+
+    def amplitude_frames(self, frames):
+        return self.src.amplitude_frames(self.duration - frames - 1)
+
     def reverse(self):
         return self.src
+
+class Timeline(object):
+    """
+    A builder for sequences of signals. Chaining `&` or `+` on a sequence copies the whole
+    sequence every time, so building a long piece that way takes quadratic time. Instead,
+    add signals to a timeline one at a time, then call `freeze` to get the sequence.
+    """
+    def __init__(self):
+        self.srcs = []
+        self.duration = 0
+
+    def _add(self, sig, start):
+        """
+        start is in samples
+        """
+        if type(sig) is DelaySignal:
+            entries = [(sig.src, start + sig.delay)]
+        elif type(sig) is SequenceSignal:
+            entries = [(src, start + src_start) for src, src_start, _ in sig.srcs]
+        else:
+            entries = [(sig, start)]
+        for src, src_start in entries:
+            self.srcs.append((src, src_start))
+            self.duration = max(self.duration, src_start + src.duration)
+
+    def add(self, sig, time=0.):
+        """
+        Add a signal to the timeline, starting at the given time.
+
+        :param sig:     The signal to add
+        :param time:    The time to start the signal at, in seconds. Optional, defaults to the
+                        beginning of the timeline.
+        """
+        self._add(sig, int(time*SAMPLE_RATE))
+        return self
+
+    def append(self, sig):
+        """
+        Add a signal to the timeline, starting when everything added so far has ended.
+        This is the equivalent of the `&` operator.
+
+        :param sig:     The signal to add
+        """
+        return self.add(sig, float(self.duration) / SAMPLE_RATE)
+
+    def freeze(self) -> Signal:
+        """
+        Return the signal of everything added to the timeline so far.
+        """
+        if not self.srcs:
+            return ConstantSignal(0)
+        return SequenceSignal(self.srcs)
+
+# Opcodes for compiled signal programs
+_LEAF = 0
+_CONST = 1
+_ADD = 2
+_MUL = 3
+_NEG = 4
+
+class Program(Signal):
+    """
+    A signal graph flattened into a linear list of buffer operations. Don't construct this
+    directly, use `compile`.
+
+    Each operation produces one block of frames into its own buffer, and the operations are
+    ordered such that every operation comes after the operations it reads from. Evaluating a
+    block is then a single loop over the operations with no recursion, and the same program
+    can be rendered any number of times.
+
+    Each operation only covers the range of frames where its node can actually be heard, for
+    example the span of a single note in a sequence. Outside that range, it is skipped, and
+    an interval index over the ranges keeps long songs from even looking at the operations
+    which aren't playing.
+    """
+    def __init__(self, root, ops, out, dtype=numpy.float64, sample_rate=SAMPLE_RATE, originals=None):
+        """
+        ops is a list of tuples of (opcode, lo, hi, arg, inputs)
+        lo and hi are the bounds of the frame range on which the op is active
+        inputs is a tuple of indices of earlier ops. The ranges of the inputs of a _MUL or _NEG
+        op contain the op's range, and the ranges of the inputs of an _ADD op are contained
+        within the op's range.
+        out is the index of the op producing the final output, or None for silence
+        dtype is the numpy dtype of the op buffers and the output
+        sample_rate is the rate the program renders at. The ops are in frames at SAMPLE_RATE,
+        and are rescaled to frames at sample_rate here. Every leaf must then be pure.
+        originals maps the ids of the copies and purifiers which compile made to the nodes of
+        root's graph that they stand for
+        """
+        self.ratio = SAMPLE_RATE / sample_rate
+        if self.ratio != 1:
+            ops = [(code, lo / self.ratio, hi / self.ratio, arg, inputs) for code, lo, hi, arg, inputs in ops]
+        self.root = root
+        self.ops = ops
+        self.out = out
+        self.sample_rate = sample_rate
+        self.duration = root.duration / self.ratio
+        self.pure = root.pure
+        self.buffers = []
+        self.profile = None
+        self.dtype = dtype
+        self.originals = originals if originals is not None else {}
+
+        self._order = sorted(range(len(ops)), key=lambda i: ops[i][1])
+        self._index = _IntervalIndex((ops[i][1] for i in self._order), (ops[i][2] for i in self._order))
+        self._inputs = {}
+        for i, (code, _, _, _, inputs) in enumerate(ops):
+            if code == _ADD:
+                inputs = sorted(inputs, key=lambda j: ops[j][1])
+                self._inputs[i] = (inputs, _IntervalIndex((ops[j][1] for j in inputs), (ops[j][2] for j in inputs)))
+
+    def amplitude(self, frame):
+        return self.amplitude_block(frame, 1)[0]
+
+    def amplitude_block(self, start, n):
+        if len(self.buffers) != len(self.ops) or (self.buffers and len(self.buffers[0]) < n):
+            self.buffers = [numpy.empty(max(n, BLOCK_SIZE), dtype=self.dtype) for _ in self.ops]
+        bufs = self.buffers
+        profile = self.profile
+
+        for i in sorted(self._order[p] for p in self._index.query(start, start + n)):
+            code, lo, hi, arg, inputs = self.ops[i]
+            a, b = _overlap(start, n, lo, hi)
+            if a >= b:
+                continue
+            t0 = perf_counter() if profile is not None and code != _LEAF else 0.
+            out = bufs[i][a-start:b-start]
+            if code == _LEAF:
+                node, offset = arg
+                if self.ratio == 1:
+                    out[:] = node.amplitude_block(a - offset, b - a)
+                else:
+                    out[:] = node.amplitude_frames(numpy.arange(a, b) * self.ratio - offset)
+            elif code == _CONST:
+                out.fill(arg)
+            elif code == _ADD:
+                out.fill(0)
+                inputs, index = self._inputs[i]
+                for j in (inputs[p] for p in index.query(a, b)):
+                    ca, cb = _overlap(a, b - a, self.ops[j][1], self.ops[j][2])
+                    if ca < cb:
+                        out[ca-a:cb-a] += bufs[j][ca-start:cb-start]
+            elif code == _MUL:
+                numpy.multiply(bufs[inputs[0]][a-start:b-start], bufs[inputs[1]][a-start:b-start], out=out)
+            elif code == _NEG:
+                numpy.negative(bufs[inputs[0]][a-start:b-start], out=out)
+            if profile is not None and code != _LEAF:
+                name = profile._opnames[code]
+                profile.operations[name] = profile.operations.get(name, 0.) + perf_counter() - t0
+
+        result = numpy.zeros(n, dtype=self.dtype)
+        if self.out is not None:
+            a, b = _overlap(start, n, self.ops[self.out][1], self.ops[self.out][2])
+            if a < b:
+                result[a-start:b-start] = bufs[self.out][a-start:b-start]
+        return result
+
+def compile(sig, dtype=numpy.float64, sample_rate=SAMPLE_RATE) -> Program:  # pylint: disable=redefined-builtin
+    """
+    Compile a signal graph into a `Program`, a flat list of block operations which can be
+    evaluated without walking the graph. The program is itself a signal, so you can keep it
+    around and render it as many times as you like.
+
+    Nodes from this module, as well as notes, are compiled into the program. Any other node
+    (oscillators, envelopes, filters, purifiers...) is evaluated through its own
+    `amplitude_block`.
+
+    The graph is simplified first (see `simplify`). Nodes which are used more than once at the
+    same point in time, or which have equal `cache_key` values, are only evaluated once per
+    block. Impure nodes which are used at more than one point in time, or which are used by
+    more than one other node, are automatically wrapped in a `Purifier`, so you don't have to
+    remember to purify them yourself. Where that means changing what a node calls into, the
+    program uses a copy of it, so the graph you passed in isn't modified.
+
+    :param sig:         The signal to compile
+    :param dtype:       The numpy dtype for the program to work in. Optional, defaults to float64.
+    :param sample_rate: The sample rate for the program to render at. Optional, defaults to
+                        SAMPLE_RATE. The graph is sampled at this rate with `amplitude_frames`,
+                        and every impure node is purified so it can be sampled in between its
+                        frames too.
+
+    If sig is already a `Program`, it is returned as it is if it has the same dtype and sample
+    rate, and its graph is compiled again otherwise.
+    """
+    if isinstance(sig, Program):
+        if numpy.dtype(sig.dtype) == numpy.dtype(dtype) and sig.sample_rate == sample_rate:
+            return sig
+        sig = sig.root
+    sig, _ = simplify(sig)
+    from .note import Note  # pylint: disable=import-outside-toplevel,cyclic-import
+
+    ops = []
+    index = {}
+    purified = {}
+
+    def emit(code, lo, hi, arg, inputs=(), key=None):
+        # identical ops are only emitted once, so shared and structurally identical parts of
+        # the graph are evaluated once per block
+        key = (code, lo, hi, arg if key is None else key, tuple(inputs))
+        if key not in index:
+            ops.append((code, lo, hi, arg, tuple(inputs)))
+            index[key] = len(ops) - 1
+        return index[key]
+
+    def visit(node, offset, lo, hi):
+        # offset is the root frame at which node's frame 0 plays
+        # [lo, hi) is the range of root frames in which node's output is used
+        # returns the index of the op producing node's output, or None if it is silent
+        if lo >= hi:
+            return None
+        ty = type(node)
+        if ty is Note:
+            return visit(node.src, offset, lo, hi)
+        if ty is DelaySignal and node.delay == int(node.delay):
+            return visit(node.src, offset + int(node.delay), lo, hi)
+        if ty is SliceSignal:
+            return visit(node.src, offset - node.from_frame, max(lo, offset), min(hi, offset + node.duration))
+        if ty is SequenceSignal and all(start == int(start) for _, start, _ in node.srcs):
+            children = [visit(src, offset + int(start), max(lo, offset + start), min(hi, offset + end)) for src, start, end in node.srcs]
+            children = [child for child in children if child is not None]
+            return emit(_ADD, lo, hi, None, children) if children else None
+        if ty is MixSignal:
+            children = [visit(src, offset, lo, hi) for src in node.signals]
+            children = [child for child in children if child is not None]
+            return emit(_ADD, lo, hi, None, children) if children else None
+        if ty is EnvelopeSignal:
+            src = visit(node.src, offset, lo, hi)
+            env = visit(node.env, offset, lo, hi)
+            if src is None or env is None:
+                return None
+            lo, hi = max(ops[src][1], ops[env][1]), min(ops[src][2], ops[env][2])
+            return emit(_MUL, lo, hi, None, (src, env)) if lo < hi else None
+        if ty is InvertSignal:
+            src = visit(node.src, offset, lo, hi)
+            return None if src is None else emit(_NEG, ops[src][1], ops[src][2], None, (src,))
+        if ty is ConstantSignal:
+            return None if node._amplitude == 0 else emit(_CONST, lo, hi, node._amplitude)
+
+        if not node.pure:
+            uses.setdefault(id(node), (node, set()))[1].add((offset, lo, hi))
+            leaves.add(id(node))
+        walk(node)
+        node = rewrite(node)
+        key = node.cache_key() if 'cache_key' in type(node).__dict__ else id(node)
+        return emit(_LEAF, lo, hi, (node, offset), key=(key, offset))
+
+    def walk(node):
+        # record a use of each impure node underneath a leaf for each edge leading to it
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if id(node) in walked:
+                continue
+            walked.add(id(node))
+            if type(node) is Purifier:
+                continue
+            for i, child in enumerate(_children(node)):
+                parents.setdefault(id(child), []).append(node)
+                if not child.pure:
+                    uses.setdefault(id(child), (child, set()))[1].add((id(node), i))
+                stack.append(child)
+
+    def rewrite(node):
+        # return the node to evaluate in place of the given one: a copy of it with every
+        # purified node underneath swapped for its purifier, wrapped in a purifier itself if need be
+        if not purified or id(node) in rewritten:
+            return rewritten.get(id(node), node)
+        new = node
+        if id(node) in dirty:
+            # nodes which don't need changing are shared with the original rather than copied
+            memo = {}
+            for below in _descendants(node):
+                if id(below) in purified:
+                    memo[id(below)] = rewrite(below)
+                elif below.pure and id(below) not in dirty:
+                    memo[id(below)] = below
+            new = copy.deepcopy(node, memo)
+            originals[id(new)] = node
+            for below in _descendants(node):
+                if id(below) not in purified and memo.get(id(below), below) is not below:
+                    originals[id(memo[id(below)])] = below
+        if id(node) in purified:
+            new = Purifier(new, dtype=dtype)
+            originals[id(new)] = node
+        rewritten[id(node)] = new
+        return new
+
+    # An impure node which is heard at more than one place has to be cached, since otherwise
+    # it would be asked for its frames out of order. That includes being used at more than one
+    # time by the compiled part of the graph, and being reached along more than one path through
+    # the graphs of the nodes it calls into. Find those first, then compile for real.
+    uses = {}
+    leaves = set()
+    walked = set()
+    parents = {}
+    rewritten = {}
+    originals = {}
+    dirty = set()
+    visit(sig, 0, float('-inf'), float('inf'))
+    for node, places in uses.values():
+        if len(places) > 1 or (sample_rate != SAMPLE_RATE and id(node) in leaves):
+            purified[id(node)] = node
+    if purified:
+        # every node with a purified node somewhere underneath has to be copied to swap it in
+        stack = list(purified)
+        while stack:
+            for parent in parents.get(stack.pop(), ()):
+                if id(parent) not in dirty:
+                    dirty.add(id(parent))
+                    stack.append(id(parent))
+        ops.clear()
+        index.clear()
+        visit(sig, 0, float('-inf'), float('inf'))
+
+    out = visit(sig, 0, float('-inf'), float('inf'))
+    return Program(sig, ops, out, dtype, sample_rate, originals)
+
+def _children(sig):
+    """
+    Return a list of the signals directly underneath the given one in its graph.
+    """
+    out = []
+    for attr in ('src', 'env', 'carrier', 'modulator', 'shift', 'wavesrc'):
+        child = getattr(sig, attr, None)
+        if isinstance(child, Signal):
+            out.append(child)
+    out.extend(getattr(sig, 'signals', ()))
+    out.extend(src for src, _, _ in getattr(sig, 'srcs', ()))
+    return out
+
+def _descendants(sig):
+    """
+    Return a list of the distinct signals underneath the given one in its graph, not counting
+    anything underneath a `Purifier`.
+    """
+    out = []
+    seen = set()
+    stack = _children(sig) if type(sig) is not Purifier else []
+    while stack:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        out.append(node)
+        if type(node) is not Purifier:
+            stack.extend(_children(node))
+    return out
+
+def _count_nodes(sig):
+    """
+    Return the number of distinct nodes in the graph of the given signal.
+    """
+    seen = set()
+    stack = [sig]
+    while stack:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        stack.extend(_children(node))
+    return len(seen)
+
+# How many times more expensive per frame a node without a block implementation is than one with
+# it, for `Signal.stats`. This is very rough.
+SCALAR_COST = 20
+
+def _graph_stats(sig):
+    """
+    Compute `Signal.stats` for the given signal.
+    """
+    # number the nodes in post-order, so each node comes after all of its children
+    order = []
+    parents = {}
+    seen = set()
+    stack = [(sig, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            order.append(node)
+            continue
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        stack.append((node, True))
+        for child in _children(node):
+            parents[id(child)] = parents.get(id(child), 0) + 1
+            stack.append((child, False))
+
+    depth = {}
+    for node in order:
+        depth[id(node)] = 1 + max((depth[id(child)] for child in _children(node)), default=0)
+
+    # then walk parents before children, counting how many frames of each node get evaluated
+    root_span = sig._render_length(None)
+    span = lambda node: min(node.duration, root_span)
+    frames = {id(sig): root_span}
+    for node in reversed(order):
+        if not span(node):
+            continue
+        times = frames.get(id(node), 0) / span(node)
+        if type(node) is Purifier:
+            # a purifier only evaluates its child once, however many times it's heard
+            times = min(times, 1)
+        if type(node) is SequenceSignal:
+            amounts = [(src, min(end - start, span(src))) for src, start, end in node.srcs]
+        else:
+            amounts = [(child, min(span(node), span(child))) for child in _children(node)]
+        for child, amount in amounts:
+            frames[id(child)] = frames.get(id(child), 0) + times * amount
+
+    by_class = {}
+    cost = 0.
+    scalar = 0
+    impure = 0
+    impure_reused = 0
+    purifiers = []
+    for node in order:
+        name = type(node).__name__
+        by_class[name] = by_class.get(name, 0) + 1
+        weight = 1
+        if type(node).amplitude_block is Signal.amplitude_block and type(node).amplitude_frames is Signal.amplitude_frames:
+            scalar += 1
+            weight = SCALAR_COST
+        cost += weight * frames.get(id(node), 0)
+        if not node.pure:
+            impure += 1
+            if parents.get(id(node), 0) > 1 or frames.get(id(node), 0) > span(node):
+                impure_reused += 1
+        if type(node) is Purifier:
+            purifiers.append(node.storage.nbytes if isinstance(node.storage, numpy.ndarray) else 8 * len(node.storage))
+
+    return {
+        'nodes': len(order),
+        'by_class': by_class,
+        'depth': depth[id(sig)],
+        'shared': sum(1 for count in parents.values() if count > 1),
+        'impure': impure,
+        'impure_reused': impure_reused,
+        'scalar': scalar,
+        'purifiers': purifiers,
+        'cost': cost / root_span if root_span else 0.,
+    }
+
+def _is_constant(sig, value=None):
+    return type(sig) is ConstantSignal and (value is None or sig._amplitude == value)
+
+def _rebuild(node, children):
+    """
+    Return a copy of the given node from this module with its children replaced, or the node
+    itself if none of them changed.
+    """
+    ty = type(node)
+    if ty is MixSignal:
+        if all(a is b for a, b in zip(node.signals, children)):
+            return node
+        return MixSignal(children)
+    if ty is SequenceSignal:
+        if all(a is b for (a, _, _), b in zip(node.srcs, children)):
+            return node
+        return SequenceSignal((src, start) for src, (_, start, _) in zip(children, node.srcs))
+    if ty is EnvelopeSignal:
+        if node.src is children[0] and node.env is children[1]:
+            return node
+        return EnvelopeSignal(*children)
+    if node.src is children[0]:
+        return node
+    if ty is InvertSignal:
+        return InvertSignal(children[0])
+    if ty is DelaySignal:
+        return DelaySignal(children[0], node.delay)
+    out = copy.copy(node)
+    out.src = children[0]
+    return out
+
+def _simplify_node(node):
+    """
+    Apply the local rewrite rules to a single node whose children are already simplified.
+    Return the node itself if no rule applies.
+    """
+    ty = type(node)
+    if ty is EnvelopeSignal:
+        factors = []
+        stack = [node]
+        while stack:
+            factor = stack.pop()
+            if type(factor) is EnvelopeSignal:
+                stack.append(factor.env)
+                stack.append(factor.src)
+            else:
+                factors.append(factor)
+        constant = 1
+        for factor in factors:
+            if _is_constant(factor):
+                constant *= factor._amplitude
+        others = [factor for factor in factors if not _is_constant(factor)]
+        if constant == 0 or not others:
+            return ConstantSignal(constant)
+        out = others[0]
+        for factor in others[1:]:
+            out = EnvelopeSignal(out, factor)
+        if constant != 1:
+            out = EnvelopeSignal(out, ConstantSignal(constant))
+        return out
+    if ty is InvertSignal:
+        if type(node.src) is InvertSignal:
+            return node.src.src
+        if _is_constant(node.src):
+            return ConstantSignal(-node.src._amplitude)
+        return node
+    if ty is DelaySignal:
+        if node.delay == 0:
+            return node.src
+        if type(node.src) is DelaySignal:
+            return DelaySignal(node.src.src, node.src.delay + node.delay)
+        return node
+    if ty is MixSignal:
+        signals = []
+        stack = list(reversed(node.signals))
+        while stack:
+            sig = stack.pop()
+            if type(sig) is MixSignal:
+                stack.extend(reversed(sig.signals))
+            else:
+                signals.append(sig)
+        constants = [sig for sig in signals if _is_constant(sig)]
+        if constants:
+            # all the constants are summed into the position of the first one
+            total = sum(sig._amplitude for sig in constants)
+            signals = [sig for sig in signals if sig is constants[0] or not _is_constant(sig)]
+            if total == 0 and len(signals) > 1:
+                signals.remove(constants[0])
+            else:
+                signals[signals.index(constants[0])] = ConstantSignal(total)
+        if len(signals) == 1:
+            return signals[0]
+        if len(signals) == len(node.signals) and all(a is b for a, b in zip(signals, node.signals)):
+            return node
+        return MixSignal(signals)
+    if ty is SequenceSignal:
+        srcs = []
+        changed = False
+        for src, start, end in node.srcs:
+            if type(src) is SequenceSignal and all(inner_start >= 0 for _, inner_start, _ in src.srcs):
+                srcs.extend((inner_src, start + inner_start) for inner_src, inner_start, _ in src.srcs)
+                changed = True
+            elif _is_constant(src, 0):
+                changed = True
+            else:
+                srcs.append((src, start))
+        if not changed:
+            return node
+        if not srcs:
+            return ConstantSignal(0)
+        return SequenceSignal(srcs)
+    return node
+
+def simplify(sig) -> Tuple[Signal, int]:
+    """
+    Rewrite a signal graph into an equivalent one which is cheaper to render. This folds
+    constant products and sums, drops multiplications by one and zero, cancels double
+    inversions, merges nested delays, and flattens nested mixes and sequences.
+
+    Only nodes from this module and notes are rewritten. Other nodes are kept as-is, and so
+    are their children, since they may be holding onto state.
+
+    Return a tuple of the new signal and the number of nodes that were removed from the graph.
+
+    :param sig:     The signal to simplify
+    """
+    from .note import Note  # pylint: disable=import-outside-toplevel,cyclic-import
+    rewritable = (MixSignal, SequenceSignal, EnvelopeSignal, InvertSignal, DelaySignal, SliceSignal, Note)
+
+    memo = {}
+    def visit(node):
+        if id(node) in memo:
+            return memo[id(node)]
+        if type(node) not in rewritable:
+            out = node
+        else:
+            out = _rebuild(node, [visit(child) for child in _children(node)])
+            rewritten = _simplify_node(out)
+            # a rewrite may never change a node's duration, since its parents depend on it
+            if rewritten.duration == out.duration:
+                out = rewritten
+        memo[id(node)] = out
+        return out
+
+    out = visit(sig)
+    return out, _count_nodes(sig) - _count_nodes(out)
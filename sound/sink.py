@@ -0,0 +1,291 @@
+from typing import Any
+import sys
+import threading
+from time import perf_counter
+
+import numpy
+
+from . import SAMPLE_RATE, _sounddevice
+from .signal import BLOCK_SIZE, StreamStats
+from .wavfile import WaveWriter, encode
+
+__all__ = ('CallbackStop', 'Sink', 'DeviceSink', 'NullSink', 'WaveSink', 'PipeSink')
+
+class CallbackStop(Exception):
+    """
+    Raise this from a `Sink.stream` callback to finish the stream once the current buffer has
+    been written.
+
+    :param frames:  How many frames at the start of the current buffer to write. A sink which
+                    isn't realtime drops the rest; the audio device plays them as they are.
+                    Optional, defaults to the whole buffer.
+    """
+    def __init__(self, frames=None):
+        super(CallbackStop, self).__init__(frames)
+        self.frames = frames
+
+class Sink(object):
+    """
+    The base class for somewhere to send rendered sample data: an audio device, a file, a pipe,
+    or nowhere at all. `Signal.play`, `Signal.play_async` and `RawData.record` all take one.
+
+    A sink is opened at a sample rate, written to one block at a time, and drained to wait for
+    everything written so far to be played or flushed. Writing to a sink which isn't open opens
+    it at SAMPLE_RATE. Can be used as a context manager, which closes it on exit.
+
+    :ivar stats:    A `StreamStats` object counting the writes made to this sink. Each write is
+                    recorded as a callback, timed by how long the write blocked for.
+    :cvar realtime: Whether this sink consumes data at a fixed rate, like an audio device, rather
+                    than as fast as it is written.
+    """
+    realtime = False
+
+    def __init__(self):
+        self.sample_rate = SAMPLE_RATE
+        self.opened = False
+        self.stats = StreamStats()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def open(self, sample_rate=SAMPLE_RATE):
+        """
+        Get ready to be written to.
+
+        :param sample_rate: The sample rate of the data which will be written. Optional.
+        """
+        self.sample_rate = sample_rate
+        self.opened = True
+
+    def write(self, block):
+        """
+        Send a block of sample data, blocking until the sink can take it.
+
+        :param block:   A numpy array of sample data in [-1, 1]
+        """
+        if not self.opened:
+            self.open()
+        t0 = perf_counter()
+        self._write(block)
+        self.stats.record_callback(len(block), perf_counter() - t0)
+
+    def _write(self, block):
+        raise NotImplementedError
+
+    def drain(self):
+        """
+        Block until everything written so far has been played or flushed.
+        """
+
+    def close(self):
+        """
+        Drain this sink and release whatever it holds. It can be opened again afterwards.
+        """
+        if self.opened:
+            self.drain()
+        self.opened = False
+
+    def stream(self, callback, blocksize=0, latency=None, finished_callback=None) -> Any:
+        """
+        Make a stream which is fed by calling a function for each buffer, like a `sounddevice`
+        callback stream. Return it, unstarted. It has ``start`` and ``stop`` methods and an
+        ``active`` attribute.
+
+        Here, the callback is called on a background thread as fast as the sink will take the
+        data. `DeviceSink` overrides this to be driven by the audio device instead.
+
+        :param callback:            Called as ``callback(outdata, frames, time, status)`` to fill
+                                    outdata, a float32 array of shape (frames, 1). It may raise
+                                    `CallbackStop` to make that buffer the last.
+        :param blocksize:           The number of frames per buffer. Optional, defaults to BLOCK_SIZE.
+        :param latency:             Ignored, for compatibility with `DeviceSink`. Optional.
+        :param finished_callback:   Called with no arguments once the stream is done. Optional.
+        """
+        return _ThreadStream(self, callback, blocksize or BLOCK_SIZE, finished_callback)
+
+    def record(self, frames, sample_rate=SAMPLE_RATE):
+        """
+        Record from this sink's input, if it has one. Return a numpy array of shape (frames, 1).
+
+        :param frames:      The number of frames to record
+        :param sample_rate: The sample rate to record at. Optional.
+        """
+        raise NotImplementedError("%s can't record" % type(self).__name__)
+
+class _ThreadStream(object):
+    """
+    A callback stream which pulls from its callback on a background thread and writes to a sink.
+    """
+    def __init__(self, sink, callback, blocksize, finished_callback):
+        self.sink = sink
+        self.callback = callback
+        self.blocksize = blocksize
+        self.finished_callback = finished_callback
+        self.active = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.active = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        outdata = numpy.zeros((self.blocksize, 1), dtype=numpy.float32)
+        try:
+            while not self._stop.is_set():
+                try:
+                    self.callback(outdata, self.blocksize, None, None)
+                except CallbackStop as e:
+                    self.sink.write(outdata[:e.frames, 0])
+                    break
+                self.sink.write(outdata[:, 0])
+            self.sink.drain()
+        finally:
+            self.active = False
+            if self.finished_callback is not None:
+                self.finished_callback()
+
+    def stop(self):
+        """
+        Stop calling the callback, and wait for the stream to finish.
+        """
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def close(self):
+        self.stop()
+
+class DeviceSink(Sink):
+    """
+    A sink which plays to the default audio device, through `sounddevice`.
+    """
+    realtime = True
+
+    def __init__(self, blocksize=0, latency=None):
+        """
+        :param blocksize:   The number of frames per device buffer. Optional, defaults to letting
+                            the device choose.
+        :param latency:     The stream latency, passed through to `sounddevice`. Optional.
+        """
+        super(DeviceSink, self).__init__()
+        self.blocksize = blocksize
+        self.latency = latency
+        self._stream = None
+
+    def open(self, sample_rate=SAMPLE_RATE):
+        super(DeviceSink, self).open(sample_rate)
+        if self._stream is None:
+            self._stream = _sounddevice().OutputStream(samplerate=sample_rate, blocksize=self.blocksize, latency=self.latency)
+
+    def _write(self, block):
+        assert self._stream is not None
+        if not self._stream.active:
+            self._stream.start()
+        if self._stream.write(numpy.asarray(block, dtype=numpy.float32)):
+            self.stats.underflows += 1
+
+    def drain(self):
+        if self._stream is not None and self._stream.active:
+            # stopping (as opposed to aborting) waits for the buffers to play out
+            self._stream.stop()
+
+    def close(self):
+        super(DeviceSink, self).close()
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def stream(self, callback, blocksize=0, latency=None, finished_callback=None) -> Any:
+        sd = _sounddevice()
+
+        def cb(outdata, frames, time, status):
+            try:
+                callback(outdata, frames, time, status)
+            except CallbackStop:
+                raise sd.CallbackStop  # pylint: disable=raise-missing-from
+
+        return sd.OutputStream(callback=cb, samplerate=self.sample_rate, blocksize=blocksize or self.blocksize,
+                               latency=latency if latency is not None else self.latency,
+                               finished_callback=finished_callback)
+
+    def record(self, frames, sample_rate=SAMPLE_RATE):
+        return _sounddevice().rec(int(frames), samplerate=sample_rate, blocking=True)
+
+class NullSink(Sink):
+    """
+    A sink which throws away everything written to it, as fast as it's written. Use it to
+    measure pure render throughput, or to run playback code without an audio device.
+
+    Recording from it gives silence.
+
+    :ivar frames:   The number of frames written since it was made.
+    """
+    def __init__(self):
+        super(NullSink, self).__init__()
+        self.frames = 0
+
+    def _write(self, block):
+        self.frames += len(block)
+
+    def record(self, frames, sample_rate=SAMPLE_RATE):
+        return numpy.zeros((int(frames), 1), dtype=numpy.float32)
+
+class WaveSink(Sink):
+    """
+    A sink which writes to a mono .wav file, see `WaveWriter`. The file is finished when the
+    sink is closed.
+    """
+    def __init__(self, fp, sample_format='int16'):
+        """
+        :param fp:              A filename or a binary file object to write to
+        :param sample_format:   One of "int16", "int24", or "float32". Optional, defaults to int16.
+        """
+        super(WaveSink, self).__init__()
+        self.fp = fp
+        self.sample_format = sample_format
+        self.writer = None
+
+    def open(self, sample_rate=SAMPLE_RATE):
+        super(WaveSink, self).open(sample_rate)
+        if self.writer is None:
+            self.writer = WaveWriter(self.fp, self.sample_format, sample_rate)
+
+    def _write(self, block):
+        assert self.writer is not None
+        self.writer.write(block)
+
+    def drain(self):
+        if self.writer is not None:
+            self.writer.fp.flush()
+
+    def close(self):
+        super(WaveSink, self).close()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+class PipeSink(Sink):
+    """
+    A sink which writes raw little-endian mono PCM to a binary file object, for example to hand
+    it off to an encoder. No header is written, so whatever reads it has to be told the format.
+    """
+    def __init__(self, fp=None, sample_format='int16'):
+        """
+        :param fp:              The file object to write to. Optional, defaults to stdout.
+        :param sample_format:   One of "int16", "int24", or "float32". Optional, defaults to int16.
+        """
+        super(PipeSink, self).__init__()
+        self.fp = fp if fp is not None else sys.stdout.buffer
+        self.sample_format = sample_format
+        encode(numpy.zeros(0), sample_format)  # fail early on a bad format
+
+    def _write(self, block):
+        self.fp.write(encode(block, self.sample_format))
+
+    def drain(self):
+        self.fp.flush()
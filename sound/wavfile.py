@@ -0,0 +1,107 @@
+import struct
+
+import numpy
+
+from . import SAMPLE_RATE
+
+__all__ = ('FORMATS', 'encode', 'WaveWriter')
+
+# sample format name -> (wave format tag, bytes per sample)
+FORMATS = {
+    'int16': (1, 2),
+    'int24': (1, 3),
+    'float32': (3, 4),
+}
+
+def encode(block, sample_format='int16'):
+    """
+    Convert a block of sample data in [-1, 1] to little-endian bytes in the given sample format.
+    Integer formats are clipped to [-1, 1] and truncated towards zero.
+
+    :param block:           A numpy array of sample data
+    :param sample_format:   One of "int16", "int24", or "float32". Optional, defaults to int16.
+    """
+    if sample_format == 'int16':
+        return (numpy.clip(block, -1, 1) * (2**15 - 1)).astype('<i2').tobytes()
+    if sample_format == 'int24':
+        ints = (numpy.clip(block, -1, 1) * (2**23 - 1)).astype('<i4')
+        return ints.view(numpy.uint8).reshape(-1, 4)[:, :3].tobytes()
+    if sample_format == 'float32':
+        return numpy.asarray(block, dtype='<f4').tobytes()
+    raise ValueError("Unknown sample format %s" % repr(sample_format))
+
+class WaveWriter(object):
+    """
+    A writer for mono .wav files which accepts sample data one block at a time.
+
+    The header is written up front with placeholder sizes and fixed up by `close`. If the file
+    can't seek, for example because it's a pipe, the sizes are left as the maximum value, which
+    most readers take to mean "until the end of the stream".
+
+    Can be used as a context manager.
+    """
+    def __init__(self, fp, sample_format='int16', samplerate=SAMPLE_RATE):
+        """
+        :param fp:              A filename or a binary file object to write to
+        :param sample_format:   One of "int16", "int24", or "float32". Optional, defaults to int16.
+        :param samplerate:      The sample rate to record in the header. Optional.
+        """
+        if sample_format not in FORMATS:
+            raise ValueError("Unknown sample format %s" % repr(sample_format))
+        self.sample_format = sample_format
+        self.samplerate = int(samplerate)
+        self.frames = 0
+        self._owned = isinstance(fp, str)
+        self.fp = open(fp, 'wb') if self._owned else fp
+        # the header goes wherever the file is positioned, which needn't be its start
+        self._start = self.fp.tell() if self._seekable() else None
+        self._write_header(0xffffffff)
+
+    def _seekable(self):
+        return getattr(self.fp, 'seekable', lambda: False)()
+
+    def _write_header(self, data_size):
+        tag, width = FORMATS[self.sample_format]
+        riff_size = 0xffffffff if data_size == 0xffffffff else 36 + data_size + data_size % 2
+        if tag != 1:
+            # non-PCM formats need an extension size in the fmt chunk and a fact chunk
+            riff_size = 0xffffffff if data_size == 0xffffffff else riff_size + 2 + 12
+        self.fp.write(b'RIFF' + struct.pack('<I', riff_size) + b'WAVE')
+        fmt = struct.pack('<HHIIHH', tag, 1, self.samplerate, self.samplerate * width, width, width * 8)
+        if tag != 1:
+            self.fp.write(b'fmt ' + struct.pack('<I', 18) + fmt + struct.pack('<H', 0))
+            self.fp.write(b'fact' + struct.pack('<II', 4, self.frames))
+        else:
+            self.fp.write(b'fmt ' + struct.pack('<I', 16) + fmt)
+        self.fp.write(b'data' + struct.pack('<I', data_size))
+
+    def write(self, block):
+        """
+        Append a block of sample data to the file.
+
+        :param block:   A numpy array of sample data in [-1, 1]
+        """
+        self.fp.write(encode(block, self.sample_format))
+        self.frames += len(block)
+
+    def close(self):
+        """
+        Fix up the header and close the file, if it was opened by this writer.
+        """
+        data_size = self.frames * FORMATS[self.sample_format][1]
+        if data_size % 2:
+            self.fp.write(b'\0')
+        if self._start is not None and data_size < 0xffffffff:
+            end = self.fp.tell()
+            self.fp.seek(self._start)
+            self._write_header(data_size)
+            self.fp.seek(end)
+        self.fp.flush()
+        if self._owned:
+            self.fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()